@@ -1,18 +1,51 @@
 from sqlmodel import SQLModel
+from sqlalchemy import event, inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import AddConstraint
 from app.config.settings import settings
 
 engine = create_async_engine(settings.database_url)
 
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+if engine.dialect.name == "sqlite":
+    # SQLite n'applique les ON DELETE CASCADE que si les cles etrangeres sont activees
+    @event.listens_for(engine.sync_engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
 
 
+def _upgrade_schema(conn) -> None:
+    # create_all ne modifie pas les tables existantes : on ajoute les index et les
+    # ON DELETE manquants sur une base creee par une version precedente
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    if conn.dialect.name != "postgresql":
+        return
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        reflected = inspector.get_foreign_keys(table.name)
+        for constraint in table.foreign_key_constraints:
+            if constraint.ondelete is None:
+                continue
+            columns = [column.name for column in constraint.columns]
+            for existing in reflected:
+                ondelete = (existing.get("options") or {}).get("ondelete") or ""
+                if existing["constrained_columns"] == columns and ondelete.upper() != constraint.ondelete.upper():
+                    conn.execute(text(f'ALTER TABLE "{table.name}" DROP CONSTRAINT "{existing["name"]}"'))
+                    conn.execute(AddConstraint(constraint))
+
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(_upgrade_schema)
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 
 class BaseLLM(ABC):
+    last_stats: dict | None = None
+
     @abstractmethod
     async def list_models(self) -> list[str]:
         pass
@@ -1,8 +1,18 @@
 from abc import ABC, abstractmethod
+import numpy as np
 
 
 class BaseSTT(ABC):
 
+    @abstractmethod
+    async def load(self) -> None:
+        pass
+
     @abstractmethod
     async def transcribe(self, audio_path: str) -> str:
         pass
+
+    @abstractmethod
+    async def transcribe_audio(self, audio: np.ndarray) -> str:
+        # Echantillons float32 mono a 16 kHz
+        pass
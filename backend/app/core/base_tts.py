@@ -3,6 +3,10 @@ from abc import ABC, abstractmethod
 
 class BaseTTS(ABC):
 
+    @abstractmethod
+    async def load(self) -> None:
+        pass
+
     @abstractmethod
     async def synthesize(self, text: str) -> tuple[bytes, int]:
         pass
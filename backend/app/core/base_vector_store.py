@@ -1,6 +1,37 @@
-
+import operator
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+# Memes operateurs que les filtres "where" de Chroma
+OPERATORS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$in": lambda value, expected: value in expected,
+    "$nin": lambda value, expected: value not in expected,
+}
+LIST_OPERATORS = ("$in", "$nin")
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+
+def _is_scalar(value) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+
+def _check_operand(key: str, op: str, expected) -> None:
+    # Chroma rejette ces filtres avec une erreur serveur : on les refuse avant la recherche
+    if op in LIST_OPERATORS:
+        if not isinstance(expected, (list, tuple)) or not all(_is_scalar(value) for value in expected):
+            raise ValueError(f"Filtre {key} : {op} attend une liste de valeurs")
+    elif op in RANGE_OPERATORS:
+        if not isinstance(expected, (int, float)) or isinstance(expected, bool):
+            raise ValueError(f"Filtre {key} : {op} attend un nombre")
+    elif not _is_scalar(expected):
+        raise ValueError(f"Filtre {key} : {op} attend une valeur simple")
 
 
 @dataclass
@@ -9,16 +40,87 @@ class Chunk:
     embedding: list[float]
     metadata: dict
     score: float = 0.0
+    id: str = ""
+
+
+def matches(metadata: dict, conditions: list[tuple[str, str, Any]]) -> bool:
+    for key, op, expected in conditions:
+        # Comme Chroma, un chunk sans la cle ne correspond a aucune condition
+        value = metadata.get(key)
+        if value is None:
+            return False
+        try:
+            if not OPERATORS[op](value, expected):
+                return False
+        except TypeError:
+            return False
+    return True
 
 
-class BaseVectorStore(ABC):
+@dataclass
+class MetadataFilter:
+    document_ids: list[str] | None = None
+    filenames: list[str] | None = None
+    # {"cle": valeur} ou {"cle": {"$gte": debut, "$lt": fin}}
+    metadata: dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.conditions()
+
+    def conditions(self) -> list[tuple[str, str, Any]]:
+        conditions = []
+        if self.document_ids is not None:
+            conditions.append(("document_id", "$in", self.document_ids))
+        if self.filenames is not None:
+            conditions.append(("filename", "$in", self.filenames))
+        for key, condition in self.metadata.items():
+            for op, expected in (condition.items() if isinstance(condition, dict) else [("$eq", condition)]):
+                if op not in OPERATORS:
+                    raise ValueError(f"Operateur de filtre inconnu : {op}")
+                _check_operand(key, op, expected)
+                # "$nin": [] n'exclut rien
+                if op == "$nin" and not expected:
+                    continue
+                conditions.append((key, op, expected))
+        return conditions
+
+    def selects_nothing(self) -> bool:
+        # Selection vide (aucun document coche...) : inutile d'interroger la base
+        return any(op == "$in" and not expected for _, op, expected in self.conditions())
+
+
+class BaseVectorReader(ABC):
+    # Lecture seule : implemente aussi par la recherche multi-collections
+    distance_space: str = "l2"
 
     @abstractmethod
-    async def add_documents(self, chunks: list[Chunk]) -> None:
+    async def get_embed_model(self) -> str:
         pass
 
+    async def recorded_embed_model(self) -> str | None:
+        # None : collection anterieure au suivi du modele, indexee avec un modele inconnu
+        return await self.get_embed_model()
+
     @abstractmethod
-    async def query(self, embedding: list[float], top_k: int = 5) -> list[Chunk]:
+    async def query(self, embedding: list[float], top_k: int = 5, filter: MetadataFilter | None = None) -> list[Chunk]:
+        pass
+
+    @abstractmethod
+    async def list_documents(self) -> list[dict]:
+        pass
+
+    async def count_documents(self) -> int:
+        return len(await self.list_documents())
+
+    @abstractmethod
+    def iter_chunks(self, batch_size: int = 1000) -> AsyncIterator[list[Chunk]]:
+        pass
+
+
+class BaseVectorStore(BaseVectorReader):
+
+    @abstractmethod
+    async def add_documents(self, chunks: list[Chunk]) -> None:
         pass
 
     @abstractmethod
@@ -26,5 +128,5 @@ class BaseVectorStore(ABC):
         pass
 
     @abstractmethod
-    async def list_documents(self) -> list[dict]:
+    async def drop_collection(self) -> None:
         pass
@@ -1,29 +1,57 @@
 import asyncio
+import importlib
+import importlib.util
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers.documents import router as documents_router
 from app.routers.chat import router as chat_router
 from app.routers.projects import router as projects_router
+from app.routers.search import router as search_router
+from app.routers.admin import router as admin_router
 from app.config.database import init_db
-from app.models.database import Project, Conversation, Message
+from app.config.settings import settings
+from app.services.ollama_pool import ollama_pool
+from app.services.document_service import IngestLimits
+from app.models.database import Project, Conversation, Message, ContextBlock, ProjectJob
 
-try:
-    from app.services.mlx_stt import MlxSTT
-    from app.services.mlx_tts import MlxTTS
-    MLX_AVAILABLE = True
-except ImportError:
-    MLX_AVAILABLE = False
+logger = logging.getLogger(__name__)
+
+# Les modeles MLX ne sont importes qu'au demarrage, et seulement s'ils sont installes
+MLX_AVAILABLE = all(importlib.util.find_spec(name) for name in ("mlx_audio", "soundfile"))
+# Avec le worker d'inference, les modeles vivent dans un autre processus
+VOICE_AVAILABLE = settings.inference_worker_enabled or MLX_AVAILABLE
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
-    if MLX_AVAILABLE:
-        app.state.stt = MlxSTT()
-        app.state.tts = MlxTTS()
-        app.state.voice_semaphore = asyncio.Semaphore(1)
+    ollama_pool.start()
+    app.state.ingest_limits = IngestLimits.from_settings()
+    if settings.inference_worker_enabled:
+        from app.services.inference_client import InferenceClient, RemoteSTT, RemoteTTS
+
+        client = InferenceClient(settings.inference_socket, settings.inference_timeout)
+        app.state.stt = RemoteSTT(client)
+        app.state.tts = RemoteTTS(client)
+    elif MLX_AVAILABLE:
+        try:
+            # find_spec trouve les paquets sans les charger : mlx peut encore echouer (plateforme, bibliotheque native)
+            for name in ("mlx_audio.stt.generate", "mlx_audio.tts.utils", "soundfile"):
+                importlib.import_module(name)
+            from app.services.mlx_stt import MlxSTT
+            from app.services.mlx_tts import MlxTTS
+        except ImportError as e:
+            logger.warning("Voix desactivee, import de MLX impossible: %s", e)
+        else:
+            app.state.stt = MlxSTT()
+            app.state.tts = MlxTTS()
+    app.state.voice_available = hasattr(app.state, "stt")
+    if app.state.voice_available:
+        app.state.voice_semaphore = asyncio.Semaphore(settings.voice_max_sessions)
     yield
+    await ollama_pool.stop()
 
 
 app = FastAPI(title="HeyRAG API", version="0.1.0", lifespan=lifespan)
@@ -38,8 +66,10 @@ app.add_middleware(
 app.include_router(documents_router)
 app.include_router(chat_router)
 app.include_router(projects_router)
+app.include_router(search_router)
+app.include_router(admin_router)
 
-if MLX_AVAILABLE:
+if VOICE_AVAILABLE:
     from app.routers.voice import router as voice_router
     app.include_router(voice_router)
 
@@ -49,5 +79,6 @@ async def health():
     return {
         "status": "ok",
         "service": "heyrag-api",
-        "voice": MLX_AVAILABLE,
+        "voice": app.state.voice_available,
+        "ollama": ollama_pool.status(),
     }
@@ -1,5 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, Index, JSON
 from uuid import uuid4, UUID
 from datetime import datetime, UTC
 
@@ -13,33 +13,56 @@ class Project(SQLModel, table=True):
     name: str
     system_prompt: str = ""
     collection_name: str = Field(unique=True)
-    created_at: datetime = Field(default_factory=utcnow)
+    created_at: datetime = Field(default_factory=utcnow, index=True)
 
     conversations: list["Conversation"] = Relationship(
         back_populates="project",
-        sa_relationship_kwargs={"cascade": "all, delete-orphan"},
+        sa_relationship_kwargs={"cascade": "all, delete-orphan", "passive_deletes": True},
     )
 
 
 class Conversation(SQLModel, table=True):
+    __table_args__ = (Index("ix_conversation_project_id_created_at", "project_id", "created_at"),)
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    project_id: UUID = Field(foreign_key="project.id")
+    project_id: UUID = Field(foreign_key="project.id", ondelete="CASCADE")
     title: str = "Nouvelle conversation"
     created_at: datetime = Field(default_factory=utcnow)
 
     project: Project = Relationship(back_populates="conversations")
     messages: list["Message"] = Relationship(
         back_populates="conversation",
-        sa_relationship_kwargs={"cascade": "all, delete-orphan"},
+        sa_relationship_kwargs={"cascade": "all, delete-orphan", "passive_deletes": True},
     )
 
 
 class Message(SQLModel, table=True):
+    __table_args__ = (Index("ix_message_conversation_id_created_at", "conversation_id", "created_at"),)
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    conversation_id: UUID = Field(foreign_key="conversation.id")
+    conversation_id: UUID = Field(foreign_key="conversation.id", ondelete="CASCADE")
     role: str
     content: str
     sources: list = Field(default=[], sa_column=Column(JSON, default=[]))
     created_at: datetime = Field(default_factory=utcnow)
 
     conversation: Conversation = Relationship(back_populates="messages")
+
+
+class ContextBlock(SQLModel, table=True):
+    # Contexte documentaire montre a un tour, en disposition "stable" des prompts
+    __table_args__ = (Index("ix_contextblock_conversation_id_turn", "conversation_id", "turn", unique=True),)
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    conversation_id: UUID = Field(foreign_key="conversation.id", ondelete="CASCADE")
+    turn: int
+    chunk_ids: list = Field(default=[], sa_column=Column(JSON, default=[]))
+    text: str
+
+
+class ProjectJob(SQLModel, table=True):
+    # Une ligne par projet en cours de reindexation ou d'import, visible de tous les workers de l'API
+    project_id: UUID = Field(foreign_key="project.id", ondelete="CASCADE", primary_key=True)
+    kind: str
+    started_at: datetime = Field(default_factory=utcnow)
+    heartbeat_at: datetime = Field(default_factory=utcnow)
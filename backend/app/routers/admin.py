@@ -0,0 +1,66 @@
+import hmac
+from typing import Literal
+from uuid import UUID
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import get_session
+from app.config.settings import settings
+from app.services.profiler import profiler
+from app.services.project_service import ProjectService
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    # Sans ADMIN_TOKEN configure, les routes d'administration sont fermees
+    if not settings.admin_token or not hmac.compare_digest(x_admin_token or "", settings.admin_token):
+        raise HTTPException(status_code=403, detail="Acces reserve aux administrateurs")
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+class ProfilingRequest(BaseModel):
+    targets: list[Literal["upload", "chat", "voice"]] = Field(min_length=1)
+    count: int = Field(default=1, gt=0, le=100)
+    project_id: UUID | None = None
+
+
+@router.post("/profiling")
+async def arm_profiling(request: ProfilingRequest, session: AsyncSession = Depends(get_session)):
+    collection = None
+    if request.project_id:
+        project = await ProjectService(session).get(request.project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Projet non trouve")
+        collection = project.collection_name
+    profiler.arm(set(request.targets), request.count, collection)
+    return profiler.status()
+
+
+@router.delete("/profiling")
+async def disarm_profiling():
+    profiler.disarm()
+    return profiler.status()
+
+
+@router.get("/profiling")
+async def profiling_status():
+    return profiler.status()
+
+
+@router.get("/profiling/{report_id}")
+async def get_profile(report_id: str):
+    report = profiler.report(report_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Profil non trouve")
+    return report
+
+
+@router.get("/profiling/{report_id}/cpu", response_class=PlainTextResponse)
+async def get_cpu_profile(report_id: str):
+    # Format "folded" : lisible par speedscope, flamegraph.pl ou inferno
+    report = profiler.report(report_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Profil non trouve")
+    return "".join(f"{stack} {count}\n" for stack, count in report["cpu"]["stacks"].items())
@@ -1,16 +1,23 @@
+import asyncio
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.database import get_session, async_session
+from app.config.settings import settings
+from app.core.base_vector_store import MetadataFilter
 from app.services.ollama_service import OllamaLLM
 from app.services.ollama_embedder import OllamaEmbedder
-from app.services.chroma_store import ChromaVectorStore
+from app.services.vector_stores import get_vector_store
 from app.services.rag_service import RAGService
+from app.services.answer_cache import answer_cache
+from app.services.prompt_context import context_log, prompt_stats
+from app.services.profiler import close_target, open_target
+from app.services.llm_scheduler import LLMBusyError, PRIORITY_CHAT, llm_scheduler
+from app.services.sse import DONE_FRAME, coalesce_tokens, sse_frame
 from app.services.project_service import ProjectService
 from app.services.conversation_service import ConversationService
-import json
 
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
@@ -22,6 +29,7 @@ class ChatRequest(BaseModel):
     project_id: UUID
     conversation_id: UUID | None = None
     options: dict = {}
+    filter: MetadataFilter | None = None
 
 
 @router.post("/stream")
@@ -31,58 +39,100 @@ async def chat_stream(request: ChatRequest, session: AsyncSession = Depends(get_
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouve")
 
-    conv_service = ConversationService(session)
-
-    if request.conversation_id:
-        conversation_id = request.conversation_id
-    else:
-        title = request.question[:50] + ("..." if len(request.question) > 50 else "")
-        conversation = await conv_service.create(project.id, title)
-        conversation_id = conversation.id
-
-    db_messages = await conv_service.get_messages(conversation_id)
-    history = [{"role": msg.role, "content": msg.content} for msg in db_messages]
-
-    await conv_service.add_message(conversation_id, "user", request.question)
+    scheduler = llm_scheduler if settings.llm_scheduler_enabled else None
+    if scheduler:
+        # Rejet immediat quand la file du modele est pleine, avant toute ecriture
+        try:
+            scheduler.check(request.model)
+        except LLMBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
 
+    store = get_vector_store(project.collection_name)
     service = RAGService(
         llm=OllamaLLM(),
-        embedder=OllamaEmbedder(),
-        store=ChromaVectorStore(project.collection_name),
+        embedder=OllamaEmbedder(await store.get_embed_model(), scheduler=scheduler, priority=PRIORITY_CHAT),
+        store=store,
+        cache=answer_cache if settings.answer_cache_enabled else None,
+        namespace=project.collection_name,
+        scheduler=scheduler,
+        priority=PRIORITY_CHAT,
+        layout=settings.prompt_layout,
+        context_log=context_log,
     )
 
+    # La recherche ne depend pas des ecritures en base : on la lance tout de suite.
+    # Elle sert aussi de cle au cache de reponses. Le profilage est ouvert avant : la tache
+    # en copie le contexte, et ses etapes (embedding, recherche) figurent dans le rapport
+    profiling = open_target("chat", project.collection_name)
+    retrieval = asyncio.create_task(service._retrieve(request.question, filter=request.filter))
+
+    try:
+        conv_service = ConversationService(session)
+
+        if request.conversation_id:
+            conversation_id = request.conversation_id
+        else:
+            title = request.question[:50] + ("..." if len(request.question) > 50 else "")
+            conversation = await conv_service.create(project.id, title)
+            conversation_id = conversation.id
+
+        db_messages = await conv_service.get_messages(conversation_id)
+        history = [{"role": msg.role, "content": msg.content} for msg in db_messages]
+
+        await conv_service.add_message(conversation_id, "user", request.question)
+    except BaseException:
+        retrieval.cancel()
+        close_target(profiling)
+        raise
+
     async def event_generator():
-        full_response = ""
+        response_parts = []
         sources_data = []
 
-        yield f"data: {json.dumps({'type': 'conversation_id', 'content': str(conversation_id)})}\n\n"
+        yield sse_frame({"type": "conversation_id", "content": str(conversation_id)})
 
         try:
-            async for event in service.ask_stream(
+            chunks = await retrieval
+            events = service.ask_stream(
                 question=request.question,
                 model=request.model,
                 conversation=history,
                 options=request.options,
                 instruction=project.system_prompt,
-            ):
+                chunks=chunks,
+                conversation_id=str(conversation_id),
+                filter=request.filter,
+            )
+            if settings.sse_coalesce:
+                events = coalesce_tokens(events, settings.sse_flush_interval, settings.sse_flush_chars)
+            async for event in events:
                 if event["type"] == "token":
-                    full_response += event["content"]
+                    response_parts.append(event["content"])
                 if event["type"] == "sources":
                     sources_data = event["content"]
-                yield f"data: {json.dumps(event)}\n\n"
+                yield sse_frame(event)
 
             async with async_session() as save_session:
                 save_service = ConversationService(save_session)
-                await save_service.add_message(conversation_id, "assistant", full_response, sources_data)
+                await save_service.add_message(conversation_id, "assistant", "".join(response_parts), sources_data)
 
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+            yield sse_frame({"type": "error", "content": str(e)})
+        finally:
+            if not retrieval.done():
+                retrieval.cancel()
+            close_target(profiling)
 
-        yield "data: [DONE]\n\n"
+        yield DONE_FRAME
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
+@router.get("/stats")
+async def chat_stats():
+    return {"layout": settings.prompt_layout, "prompts": prompt_stats.summary()}
+
+
 @router.get("/models")
 async def list_models():
     llm = OllamaLLM()
@@ -1,13 +1,19 @@
+import asyncio
 import uuid
+import zipfile
+from contextlib import aclosing
 from pathlib import Path
 from uuid import UUID
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.database import get_session
+from app.config.settings import settings
 from app.services.ollama_embedder import OllamaEmbedder
-from app.services.chroma_store import ChromaVectorStore
+from app.services.vector_stores import get_vector_store
 from app.services.document_service import DocumentService
+from app.services.text_cache import text_cache
 from app.services.project_service import ProjectService
+from app.services import job_lock
 
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
@@ -16,11 +22,78 @@ UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt", ".md"}
 MAX_FILE_SIZE = 50 * 1024 * 1024
+MAX_BULK_FILES = 1000
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def _copy_limited(source, file_path: Path) -> bool:
+    written = 0
+    with open(file_path, "wb") as f:
+        while block := source.read(COPY_BLOCK_SIZE):
+            written += len(block)
+            if written > MAX_FILE_SIZE:
+                break
+            f.write(block)
+    if written > MAX_FILE_SIZE:
+        file_path.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def _extract_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, file_path: Path) -> bool:
+    with archive.open(info) as source:
+        return _copy_limited(source, file_path)
+
+
+async def _ensure_writable(project_id: UUID) -> None:
+    # Une ecriture faite pendant une reindexation irait dans la collection abandonnee au basculement.
+    # Le verrou est en base : il couvre les jobs lances par les autres workers de l'API
+    if await job_lock.active_job(project_id):
+        raise HTTPException(status_code=409, detail="Reindexation en cours pour ce projet, reessayez une fois terminee")
+
+
+async def _unpack(file: UploadFile):
+    # Produit (chemin, nom, erreur) au fil de l'eau, une entree d'archive a la fois
+    if Path(file.filename).suffix.lower() != ".zip":
+        extension = Path(file.filename).suffix.lower()
+        if extension not in ALLOWED_EXTENSIONS:
+            yield None, file.filename, f"Format non supporte : {extension}"
+            return
+        file_path = UPLOAD_DIR / f"{uuid.uuid4()}{extension}"
+        if not await asyncio.to_thread(_copy_limited, file.file, file_path):
+            yield None, file.filename, "Fichier trop volumineux (max 50 Mo)"
+            return
+        yield file_path, file.filename, None
+        return
+
+    try:
+        archive = await asyncio.to_thread(zipfile.ZipFile, file.file)
+    except zipfile.BadZipFile:
+        yield None, file.filename, "Archive ZIP invalide"
+        return
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            name = info.filename
+            extension = Path(name).suffix.lower()
+            if extension not in ALLOWED_EXTENSIONS:
+                yield None, name, f"Format non supporte : {extension}"
+                continue
+            if info.file_size > MAX_FILE_SIZE:
+                yield None, name, "Fichier trop volumineux (max 50 Mo)"
+                continue
+            file_path = UPLOAD_DIR / f"{uuid.uuid4()}{extension}"
+            if not await asyncio.to_thread(_extract_entry, archive, info, file_path):
+                yield None, name, "Fichier trop volumineux (max 50 Mo)"
+                continue
+            yield file_path, name, None
 
 
 @router.post("/upload")
 async def upload_document(
     project_id: UUID,
+    request: Request,
     file: UploadFile = File(...),
     session: AsyncSession = Depends(get_session),
 ):
@@ -28,6 +101,7 @@ async def upload_document(
     project = await project_service.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouve")
+    await _ensure_writable(project_id)
 
     extension = Path(file.filename).suffix.lower()
     if extension not in ALLOWED_EXTENSIONS:
@@ -43,9 +117,12 @@ async def upload_document(
         f.write(content)
 
     try:
+        store = get_vector_store(project.collection_name)
         service = DocumentService(
-            embedder=OllamaEmbedder(),
-            store=ChromaVectorStore(project.collection_name),
+            embedder=OllamaEmbedder(await store.get_embed_model()),
+            store=store,
+            text_cache=text_cache if settings.text_cache_enabled else None,
+            limits=request.app.state.ingest_limits,
         )
         result = await service.upload(str(file_path), file.filename)
         return result
@@ -53,6 +130,76 @@ async def upload_document(
         file_path.unlink(missing_ok=True)
 
 
+@router.post("/upload/bulk")
+async def upload_documents_bulk(
+    project_id: UUID,
+    request: Request,
+    files: list[UploadFile] = File(...),
+    session: AsyncSession = Depends(get_session),
+):
+    project_service = ProjectService(session)
+    project = await project_service.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Projet non trouve")
+    await _ensure_writable(project_id)
+
+    store = get_vector_store(project.collection_name)
+    service = DocumentService(
+        embedder=OllamaEmbedder(await store.get_embed_model()),
+        store=store,
+        text_cache=text_cache if settings.text_cache_enabled else None,
+        limits=request.app.state.ingest_limits,
+    )
+
+    async def ingest(file_path: Path, filename: str) -> dict:
+        try:
+            return {"status": "ok", **await service.ingest(str(file_path), filename)}
+        except Exception as e:
+            return {"filename": filename, "status": "error", "error": str(e)}
+        finally:
+            file_path.unlink(missing_ok=True)
+
+    # Pool de workers et file bornee : l'extraction attend que les workers suivent
+    results: list[dict | None] = []
+    workers = settings.ingest_parse_concurrency + settings.ingest_embed_concurrency
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers)
+
+    async def worker():
+        while (item := await queue.get()) is not None:
+            index, file_path, filename = item
+            results[index] = await ingest(file_path, filename)
+
+    # Au-dela de MAX_BULK_FILES, plus rien n'est extrait : ni les entrees restantes, ni les fichiers suivants
+    truncated = False
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        for file in files:
+            if len(results) >= MAX_BULK_FILES:
+                truncated = True
+                break
+            async with aclosing(_unpack(file)) as entries:
+                async for file_path, filename, error in entries:
+                    if len(results) >= MAX_BULK_FILES:
+                        if file_path:
+                            file_path.unlink(missing_ok=True)
+                        truncated = True
+                        break
+                    if error:
+                        results.append({"filename": filename, "status": "error", "error": error})
+                    else:
+                        results.append(None)
+                        await queue.put((len(results) - 1, file_path, filename))
+    finally:
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    response = {"results": results, "truncated": truncated}
+    if truncated:
+        response["detail"] = f"Limite de {MAX_BULK_FILES} fichiers atteinte : les fichiers suivants n'ont pas ete traites"
+    return response
+
+
 @router.get("/")
 async def list_documents(project_id: UUID, session: AsyncSession = Depends(get_session)):
     project_service = ProjectService(session)
@@ -61,7 +208,7 @@ async def list_documents(project_id: UUID, session: AsyncSession = Depends(get_s
         raise HTTPException(status_code=404, detail="Projet non trouve")
     service = DocumentService(
         embedder=OllamaEmbedder(),
-        store=ChromaVectorStore(project.collection_name),
+        store=get_vector_store(project.collection_name),
     )
     return await service.list_documents()
 
@@ -72,9 +219,10 @@ async def delete_document(document_id: str, project_id: UUID, session: AsyncSess
     project = await project_service.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouve")
+    await _ensure_writable(project_id)
     service = DocumentService(
         embedder=OllamaEmbedder(),
-        store=ChromaVectorStore(project.collection_name),
+        store=get_vector_store(project.collection_name),
     )
     await service.delete_document(document_id)
     return {"status": "deleted", "document_id": document_id}
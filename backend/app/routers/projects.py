@@ -1,11 +1,23 @@
-from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+import asyncio
+import os
+import shutil
+import tempfile
+from uuid import UUID, uuid4
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.database import get_session
 from app.services.project_service import ProjectService
 from app.services.conversation_service import ConversationService
-from app.services.chroma_store import ChromaVectorStore
+from app.services.vector_stores import get_vector_store, get_vector_stores, schedule_drop
+from app.services.pagination import CursorError
+from app.services.snapshot_service import SnapshotError, SnapshotService
+from app.services.reembed_service import ReembedError, jobs as reembed_jobs, start_reembed
+from app.services.rebuild_service import RebuildError, jobs as rebuild_jobs, start_rebuild
+from app.services import job_lock
+from app.config.settings import settings
 
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
@@ -25,6 +37,15 @@ class UpdateConversationRequest(BaseModel):
     title: str
 
 
+class ReembedRequest(BaseModel):
+    model: str | None = None
+
+
+class RebuildRequest(BaseModel):
+    chunk_size: int | None = Field(default=None, gt=0)
+    chunk_overlap: int | None = Field(default=None, ge=0)
+
+
 @router.post("/")
 async def create_project(request: CreateProjectRequest, session: AsyncSession = Depends(get_session)):
     service = ProjectService(session)
@@ -37,6 +58,33 @@ async def list_projects(session: AsyncSession = Depends(get_session)):
     return await service.list_all()
 
 
+@router.get("/summary")
+async def list_projects_summary(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_session),
+):
+    service = ProjectService(session)
+    try:
+        rows, next_cursor = await service.list_page(limit, cursor)
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stores = await get_vector_stores([project.collection_name for project, _ in rows])
+    document_counts = await asyncio.gather(
+        *(stores[project.collection_name].count_documents() for project, _ in rows),
+        return_exceptions=True,
+    )
+    items = [
+        {
+            **project.model_dump(),
+            "conversation_count": conversation_count,
+            "document_count": None if isinstance(document_count, Exception) else document_count,
+        }
+        for (project, conversation_count), document_count in zip(rows, document_counts)
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @router.get("/{project_id}")
 async def get_project(project_id: UUID, session: AsyncSession = Depends(get_session)):
     service = ProjectService(session)
@@ -61,16 +109,134 @@ async def delete_project(project_id: UUID, session: AsyncSession = Depends(get_s
     project = await service.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouve")
-    try:
-        store = ChromaVectorStore(project.collection_name)
-        await store._get_collection()
-        await store._client.delete_collection(name=project.collection_name)
-    except Exception:
-        pass
     await service.delete(project_id)
+    schedule_drop(project.collection_name)
     return {"status": "deleted"}
 
 
+@router.get("/{project_id}/export")
+async def export_project(project_id: UUID, dtype: str = "float32", session: AsyncSession = Depends(get_session)):
+    service = ProjectService(session)
+    project = await service.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Projet non trouve")
+    if await job_lock.active_job(project_id):
+        raise HTTPException(status_code=409, detail="Reindexation en cours pour ce projet, reessayez une fois terminee")
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    try:
+        await SnapshotService(get_vector_store(project.collection_name)).export(path, dtype)
+    except BaseException as e:
+        os.unlink(path)
+        if isinstance(e, SnapshotError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        filename=f"{project.collection_name}.zip",
+        background=BackgroundTask(os.unlink, path),
+    )
+
+
+@router.post("/{project_id}/import")
+async def import_project(
+    project_id: UUID,
+    file: UploadFile = File(...),
+    replace: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    service = ProjectService(session)
+    project = await service.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Projet non trouve")
+    # L'import est un job comme les autres : les ecritures sont refusees jusqu'au basculement
+    if not await job_lock.acquire(project_id, "import"):
+        raise HTTPException(status_code=409, detail="Reindexation en cours pour ce projet, reessayez une fois terminee")
+    async with job_lock.held(project_id):
+        return await _import_archive(service, project, file, replace)
+
+
+async def _import_archive(service: ProjectService, project, file: UploadFile, replace: bool):
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, f)
+        source_collection = project.collection_name
+        source = get_vector_store(source_collection)
+        if not replace:
+            return await SnapshotService(source).restore(path)
+        # Restauration dans une nouvelle collection : l'ancienne ne disparait qu'une fois l'import reussi
+        target_collection = f"project_{uuid4().hex[:8]}"
+        target = get_vector_store(target_collection, embed_model=await source.get_embed_model())
+        try:
+            result = await SnapshotService(target).restore(path)
+            if not await service.switch_collection(project.id, source_collection, target_collection):
+                raise SnapshotError("Le projet a ete modifie pendant l'import")
+        except BaseException:
+            # Y compris quand la bascule est perdue : la nouvelle collection n'est referencee par aucun projet
+            schedule_drop(target_collection)
+            raise
+        schedule_drop(source_collection, delay=settings.reembed_drop_delay)
+        return result
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.unlink(path)
+
+
+@router.post("/{project_id}/reembed", status_code=202)
+async def reembed_project(project_id: UUID, request: ReembedRequest, session: AsyncSession = Depends(get_session)):
+    service = ProjectService(session)
+    project = await service.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Projet non trouve")
+    try:
+        return await start_reembed(project, request.model or settings.ollama_embed_model)
+    except ReembedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/{project_id}/reembed")
+async def get_reembed_status(project_id: UUID):
+    job = reembed_jobs.get(project_id)
+    if not job:
+        # Job lance par un autre worker de l'API : seul son etat en base est connu ici
+        running = await job_lock.active_job(project_id)
+        if running and running.kind == "reembed":
+            return {"project_id": project_id, "status": "running", "started_at": running.started_at}
+        raise HTTPException(status_code=404, detail="Aucune reindexation pour ce projet")
+    return job
+
+
+@router.post("/{project_id}/rebuild", status_code=202)
+async def rebuild_project(project_id: UUID, request: RebuildRequest, http_request: Request, session: AsyncSession = Depends(get_session)):
+    service = ProjectService(session)
+    project = await service.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Projet non trouve")
+    chunk_size = request.chunk_size or settings.chunk_size
+    chunk_overlap = settings.chunk_overlap if request.chunk_overlap is None else request.chunk_overlap
+    if chunk_overlap >= chunk_size:
+        raise HTTPException(status_code=400, detail="Le chevauchement doit etre inferieur a la taille des chunks")
+    try:
+        return await start_rebuild(project, chunk_size, chunk_overlap, http_request.app.state.ingest_limits)
+    except RebuildError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/{project_id}/rebuild")
+async def get_rebuild_status(project_id: UUID):
+    job = rebuild_jobs.get(project_id)
+    if not job:
+        # Job lance par un autre worker de l'API : seul son etat en base est connu ici
+        running = await job_lock.active_job(project_id)
+        if running and running.kind == "rebuild":
+            return {"project_id": project_id, "status": "running", "started_at": running.started_at}
+        raise HTTPException(status_code=404, detail="Aucune reconstruction pour ce projet")
+    return job
+
+
 @router.post("/{project_id}/conversations")
 async def create_conversation(project_id: UUID, session: AsyncSession = Depends(get_session)):
     project_service = ProjectService(session)
@@ -86,6 +252,25 @@ async def list_conversations(project_id: UUID, session: AsyncSession = Depends(g
     return await service.list_by_project(project_id)
 
 
+@router.get("/{project_id}/conversations/summary")
+async def list_conversations_summary(
+    project_id: UUID,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_session),
+):
+    service = ConversationService(session)
+    try:
+        rows, next_cursor = await service.list_page(project_id, limit, cursor)
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items = [
+        {**conversation.model_dump(), "message_count": message_count, "last_message_at": last_message_at}
+        for conversation, message_count, last_message_at in rows
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @router.patch("/conversations/{conversation_id}")
 async def update_conversation(conversation_id: UUID, request: UpdateConversationRequest, session: AsyncSession = Depends(get_session)):
     service = ConversationService(session)
@@ -0,0 +1,71 @@
+import asyncio
+import heapq
+from collections import defaultdict
+from itertools import islice
+from uuid import UUID
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import get_session
+from app.config.settings import settings
+from app.core.base_vector_store import MetadataFilter
+from app.services.ollama_embedder import OllamaEmbedder
+from app.services.vector_stores import get_vector_stores
+from app.services.fanout_store import FanoutVectorStore
+from app.services.project_service import ProjectService
+from app.services.rag_service import MAX_DISTANCE
+
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+
+class SearchRequest(BaseModel):
+    question: str
+    project_ids: list[UUID] | None = None
+    top_k: int = 5
+    filter: MetadataFilter | None = None
+
+
+@router.post("/")
+async def search(request: SearchRequest, session: AsyncSession = Depends(get_session)):
+    if request.project_ids == [] or (request.filter is not None and request.filter.selects_nothing()):
+        return {"results": []}
+    projects = await ProjectService(session).list_all(request.project_ids)
+    if not projects:
+        return {"results": []}
+
+    by_collection = {project.collection_name: project for project in projects}
+    stores = await get_vector_stores(list(by_collection))
+
+    # Une question n'est comparable qu'aux collections indexees avec le meme modele
+    models = await asyncio.gather(*(store.get_embed_model() for store in stores.values()))
+    groups = defaultdict(dict)
+    for (name, store), model in zip(stores.items(), models):
+        groups[model][name] = store
+
+    async def query_group(model: str, group: dict) -> list:
+        store = FanoutVectorStore(
+            group,
+            max_concurrency=settings.fanout_max_concurrency,
+            shard_timeout=settings.fanout_shard_timeout,
+        )
+        embedding = await OllamaEmbedder(model).embed(request.question)
+        return await store.query(embedding, top_k=request.top_k, filter=request.filter)
+
+    shards = await asyncio.gather(*(query_group(model, group) for model, group in groups.items()))
+    chunks = list(islice(heapq.merge(*shards, key=lambda chunk: chunk.score), request.top_k))
+
+    results = []
+    for chunk in chunks:
+        if chunk.score >= MAX_DISTANCE:
+            continue
+        project = by_collection[chunk.metadata["collection"]]
+        results.append({
+            "project_id": str(project.id),
+            "project_name": project.name,
+            "filename": chunk.metadata.get("filename", "inconnu"),
+            "chunk_index": chunk.metadata.get("chunk_index", 0),
+            "text": chunk.text,
+            "score": chunk.score,
+        })
+    return {"results": results}
@@ -1,11 +1,16 @@
 import logging
 import asyncio
+from uuid import UUID
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.config.database import async_session
+from app.config.settings import settings
 from app.services.ollama_service import OllamaLLM
 from app.services.ollama_embedder import OllamaEmbedder
-from app.services.chroma_store import ChromaVectorStore
+from app.services.vector_stores import get_vector_store
 from app.services.rag_service import RAGService
+from app.services.answer_cache import answer_cache
+from app.services.prompt_context import context_log
+from app.services.llm_scheduler import PRIORITY_VOICE, llm_scheduler
 from app.services.voice_service import VoiceService
 from app.services.project_service import ProjectService
 from app.services.conversation_service import ConversationService
@@ -20,6 +25,10 @@ RECEIVE_TIMEOUT = 30
 @router.websocket("/ws/voice")
 async def voice_ws(ws: WebSocket):
     await ws.accept()
+    if not ws.app.state.voice_available:
+        await ws.send_json({"type": "error", "content": "Voix indisponible sur ce serveur"})
+        await ws.close()
+        return
     try:
         config = await asyncio.wait_for(ws.receive_json(), timeout=RECEIVE_TIMEOUT)
         if config.get("type") != "config":
@@ -27,10 +36,13 @@ async def voice_ws(ws: WebSocket):
             await ws.close()
             return
 
-        project_id = config["project_id"]
+        project_id = UUID(config["project_id"])
         model = config["model"]
-        conversation_id = config.get("conversation_id")
+        conversation_id = UUID(config["conversation_id"]) if config.get("conversation_id") else None
         options = config.get("options", {})
+        scheduler = llm_scheduler if settings.llm_scheduler_enabled else None
+        if scheduler:
+            scheduler.check(model)
 
         audio_bytes = await asyncio.wait_for(ws.receive_bytes(), timeout=RECEIVE_TIMEOUT)
         if len(audio_bytes) < 100:
@@ -53,10 +65,17 @@ async def voice_ws(ws: WebSocket):
 
                 conv_service = ConversationService(session)
 
+                store = get_vector_store(project.collection_name)
                 rag = RAGService(
                     llm=OllamaLLM(),
-                    embedder=OllamaEmbedder(),
-                    store=ChromaVectorStore(project.collection_name),
+                    embedder=OllamaEmbedder(await store.get_embed_model(), scheduler=scheduler, priority=PRIORITY_VOICE),
+                    store=store,
+                    cache=answer_cache if settings.answer_cache_enabled else None,
+                    namespace=project.collection_name,
+                    scheduler=scheduler,
+                    priority=PRIORITY_VOICE,
+                    layout=settings.prompt_layout,
+                    context_log=context_log,
                 )
                 voice = VoiceService(stt=stt, tts=tts, rag=rag)
 
@@ -88,6 +107,7 @@ async def voice_ws(ws: WebSocket):
                 conversation=history,
                 options=options,
                 instruction=project.system_prompt,
+                conversation_id=str(conversation_id),
             ):
                 if event["type"] == "token":
                     full_response += event["content"]
@@ -95,6 +115,8 @@ async def voice_ws(ws: WebSocket):
                 elif event["type"] == "sources":
                     sources_data = event["content"]
                     await ws.send_json(event)
+                elif event["type"] == "queue":
+                    await ws.send_json(event)
                 elif event["type"] == "audio":
                     await ws.send_bytes(event["content"])
                     await ws.send_json({"type": "audio_done"})
@@ -0,0 +1,131 @@
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+from app.config.settings import settings
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def unit_vector(embedding: list[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@dataclass
+class CachedAnswer:
+    tokens: list[str]
+    sources: list[dict]
+    chunk_ids: tuple[str, ...]
+    embedding: list[float] | None = None
+    created_at: float = 0.0
+
+    @property
+    def answer(self) -> str:
+        return "".join(self.tokens)
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, similarity: float | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: OrderedDict[tuple, CachedAnswer] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        # Vecteurs unitaires des entrees, groupes par portee et chunks retrouves : seules les
+        # entrees du meme groupe sont comparables, scorees en un produit matrice-vecteur
+        self._vectors: dict[tuple, dict[tuple, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def _scope(self, namespace: str, model: str, instruction: str, options: dict | None) -> tuple:
+        return (
+            namespace,
+            self._generations.get(namespace, 0),
+            model,
+            instruction,
+            json.dumps(options or {}, sort_keys=True),
+        )
+
+    def _is_fresh(self, entry: CachedAnswer) -> bool:
+        return time.monotonic() - entry.created_at < self.ttl
+
+    def _remove(self, key: tuple) -> None:
+        # Appele avec le verrou
+        entry = self._entries.pop(key)
+        group = (key[:-1], entry.chunk_ids)
+        vectors = self._vectors.get(group)
+        if vectors is not None:
+            vectors.pop(key, None)
+            if not vectors:
+                del self._vectors[group]
+
+    def get(self, namespace: str, model: str, question: str, chunk_ids: tuple[str, ...], instruction: str = "", options: dict = None) -> CachedAnswer | None:
+        # Les chunks retrouves font partie de la cle : un document ajoute ou supprime par un autre
+        # worker, dont la generation locale n'a pas change, change aussi les chunks retrouves
+        key = self._scope(namespace, model, instruction, options) + (normalize_question(question),)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.chunk_ids != chunk_ids:
+                return None
+            if not self._is_fresh(entry):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get_similar(self, namespace: str, model: str, embedding: list[float], chunk_ids: tuple[str, ...], instruction: str = "", options: dict = None) -> CachedAnswer | None:
+        if self.similarity is None:
+            return None
+        group = (self._scope(namespace, model, instruction, options), chunk_ids)
+        query = unit_vector(embedding)
+        with self._lock:
+            vectors = self._vectors.get(group)
+            if not vectors:
+                return None
+            keys = list(vectors)
+            scores = np.stack(list(vectors.values())) @ query
+            for row in np.argsort(-scores):
+                if scores[row] < self.similarity:
+                    return None
+                key = keys[row]
+                if self._is_fresh(self._entries[key]):
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+                self._remove(key)
+            return None
+
+    def put(self, namespace: str, model: str, question: str, entry: CachedAnswer, instruction: str = "", options: dict = None) -> None:
+        key = self._scope(namespace, model, instruction, options) + (normalize_question(question),)
+        entry.created_at = time.monotonic()
+        vector = unit_vector(entry.embedding) if entry.embedding is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            if vector is not None:
+                self._vectors.setdefault((key[:-1], entry.chunk_ids), {})[key] = vector
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, namespace: str) -> None:
+        # La generation fait partie de la cle : les anciennes entrees deviennent inaccessibles
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            for key in [key for key in self._entries if key[0] == namespace]:
+                self._remove(key)
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.answer_cache_max_entries,
+    ttl=settings.answer_cache_ttl,
+    similarity=settings.answer_cache_similarity,
+)
@@ -1,42 +1,81 @@
 import uuid
-import chromadb
-from app.core.base_vector_store import BaseVectorStore, Chunk
+from app.core.base_vector_store import BaseVectorStore, Chunk, MetadataFilter
 from app.config.settings import settings
+from app.services.answer_cache import answer_cache
+from app.services.profiler import profile_stage
+
+
+def where_clause(filter: MetadataFilter | None) -> dict | None:
+    clauses = [{key: {op: expected}} for key, op, expected in (filter.conditions() if filter else [])]
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else None
 
 
 class ChromaVectorStore(BaseVectorStore):
 
-    def __init__(self, collection_name: str):
+    def __init__(self, collection_name: str, client=None, embed_model: str | None = None):
         self.collection_name = collection_name
-        self._client = None
+        self.embed_model = embed_model
+        self._client = client
         self._collection = None
 
+    @staticmethod
+    async def _connect():
+        import chromadb
+
+        return await chromadb.AsyncHttpClient(
+            host=settings.chroma_host,
+            port=settings.chroma_port,
+        )
+
+    @classmethod
+    async def for_collections(cls, collection_names: list[str]) -> dict[str, "ChromaVectorStore"]:
+        client = await cls._connect()
+        return {name: cls(name, client=client) for name in collection_names}
+
     async def _get_collection(self):
         if self._client is None:
-            self._client = await chromadb.AsyncHttpClient(
-                host=settings.chroma_host,
-                port=settings.chroma_port,
-            )
+            self._client = await self._connect()
         if self._collection is None:
             self._collection = await self._client.get_or_create_collection(
-                name=self.collection_name
+                name=self.collection_name,
+                metadata={"embed_model": self.embed_model or settings.ollama_embed_model},
             )
+            metadata = self._collection.metadata or {}
+            self.distance_space = metadata.get("hnsw:space", "l2")
+            self.embed_model = metadata.get("embed_model")
         return self._collection
 
+    async def get_embed_model(self) -> str:
+        await self._get_collection()
+        return self.embed_model or settings.ollama_embed_model
+
+    async def recorded_embed_model(self) -> str | None:
+        await self._get_collection()
+        return self.embed_model
+
+    @profile_stage("store")
     async def add_documents(self, chunks: list[Chunk]) -> None:
         collection = await self._get_collection()
         await collection.add(
-            ids=[str(uuid.uuid4()) for _ in chunks],
+            ids=[chunk.id or str(uuid.uuid4()) for chunk in chunks],
             documents=[chunk.text for chunk in chunks],
             embeddings=[chunk.embedding for chunk in chunks],
             metadatas=[chunk.metadata for chunk in chunks],
         )
+        answer_cache.invalidate(self.collection_name)
 
-    async def query(self, embedding: list[float], top_k: int = 5) -> list[Chunk]:
+    @profile_stage("search")
+    async def query(self, embedding: list[float], top_k: int = 5, filter: MetadataFilter | None = None) -> list[Chunk]:
+        if filter is not None and filter.selects_nothing():
+            return []
         collection = await self._get_collection()
+        # Le filtre est applique par Chroma pendant la recherche, pas sur les resultats
         results = await collection.query(
             query_embeddings=[embedding],
             n_results=top_k,
+            where=where_clause(filter),
             include=["documents", "metadatas", "distances"],
         )
         chunks = []
@@ -46,12 +85,14 @@ class ChromaVectorStore(BaseVectorStore):
                 embedding=[],
                 metadata=results["metadatas"][0][i],
                 score=results["distances"][0][i],
+                id=results["ids"][0][i],
             ))
         return chunks
 
     async def delete_document(self, document_id: str) -> None:
         collection = await self._get_collection()
         await collection.delete(where={"document_id": document_id})
+        answer_cache.invalidate(self.collection_name)
 
     async def list_documents(self) -> list[dict]:
         collection = await self._get_collection()
@@ -62,3 +103,34 @@ class ChromaVectorStore(BaseVectorStore):
             if doc_id and doc_id not in documents:
                 documents[doc_id] = metadata
         return list(documents.values())
+
+    async def count_documents(self) -> int:
+        # Chaque document a exactement un chunk d'index 0 : on ne lit que les ids
+        collection = await self._get_collection()
+        results = await collection.get(where={"chunk_index": 0}, include=[])
+        return len(results["ids"])
+
+    async def iter_chunks(self, batch_size: int = 1000):
+        collection = await self._get_collection()
+        offset = 0
+        while True:
+            results = await collection.get(
+                include=["documents", "metadatas", "embeddings"],
+                limit=batch_size,
+                offset=offset,
+            )
+            if not results["ids"]:
+                return
+            yield [
+                Chunk(text=text, embedding=embedding, metadata=metadata, id=chunk_id)
+                for chunk_id, text, embedding, metadata in zip(
+                    results["ids"], results["documents"], results["embeddings"], results["metadatas"],
+                )
+            ]
+            offset += len(results["ids"])
+
+    async def drop_collection(self) -> None:
+        await self._get_collection()
+        await self._client.delete_collection(name=self.collection_name)
+        self._collection = None
+        answer_cache.invalidate(self.collection_name)
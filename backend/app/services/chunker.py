@@ -1,8 +1,15 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
 
 class Chunker:
 
     def __init__(self, chunk_size: int = 500, overlap: int = 50):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=overlap,
@@ -10,3 +17,78 @@ class Chunker:
 
     def chunk(self, text: str) -> list[str]:
         return self.splitter.split_text(text)
+
+
+@dataclass
+class TextChunk:
+    text: str
+    page: int
+    start: int
+    end: int
+
+
+class StreamingChunker:
+
+    def __init__(self, chunk_size: int = 500, overlap: int = 50):
+        if overlap >= chunk_size:
+            raise ValueError("Le chevauchement doit etre inferieur a la taille des chunks")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def _split_point(self, buffer: str, pos: int) -> int:
+        limit = pos + self.chunk_size
+        lower = pos + self.chunk_size // 2
+        for separator in SEPARATORS:
+            index = buffer.rfind(separator, lower, limit)
+            if index != -1:
+                return index + len(separator)
+        return limit
+
+    def _next_start(self, buffer: str, pos: int, cut: int) -> int:
+        start = max(cut - self.overlap, pos + 1)
+        if start >= cut:
+            return cut
+        # Le chevauchement commence sur une frontiere de mot quand c'est possible
+        for index in range(start, cut):
+            if buffer[index].isspace():
+                return index + 1
+        return start
+
+    def chunk_pages(self, segments: Iterable[tuple[int, str]]) -> Iterator[TextChunk]:
+        # Offsets globaux dans le texte concatene ; buffer ne garde que la fin non decoupee
+        buffer = ""
+        base = 0
+        pos = 0
+        emitted_until = 0
+        pages: deque[tuple[int, int]] = deque()
+        current_page = None
+
+        def emit(start: int, cut: int) -> TextChunk | None:
+            raw = buffer[start:cut]
+            text = raw.strip()
+            if not text:
+                return None
+            global_start = base + start + (len(raw) - len(raw.lstrip()))
+            while len(pages) > 1 and pages[1][0] <= global_start:
+                pages.popleft()
+            return TextChunk(text=text, page=pages[0][1], start=global_start, end=global_start + len(text))
+
+        for page, text in segments:
+            if page != current_page:
+                pages.append((base + len(buffer), page))
+                current_page = page
+            buffer = buffer[pos:] + text
+            base += pos
+            pos = 0
+            while len(buffer) - pos > self.chunk_size:
+                cut = self._split_point(buffer, pos)
+                chunk = emit(pos, cut)
+                if chunk:
+                    yield chunk
+                emitted_until = base + cut
+                pos = self._next_start(buffer, pos, cut)
+
+        if base + len(buffer) > emitted_until:
+            chunk = emit(pos, len(buffer))
+            if chunk:
+                yield chunk
@@ -1,7 +1,9 @@
 from uuid import UUID
-from sqlmodel import select
+from datetime import datetime
+from sqlmodel import and_, delete, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.database import Conversation, Message
+from app.services.pagination import decode_cursor, encode_cursor
 
 
 class ConversationService:
@@ -24,6 +26,38 @@ class ConversationService:
         )
         return list(result.scalars().all())
 
+    async def list_page(self, project_id: UUID, limit: int = 50, cursor: str | None = None) -> tuple[list[tuple[Conversation, int, datetime | None]], str | None]:
+        # Sous-requetes correlees : evaluees seulement pour les lignes de la page,
+        # via l'index (conversation_id, created_at)
+        message_count = (
+            select(func.count(Message.id))
+            .where(Message.conversation_id == Conversation.id)
+            .scalar_subquery()
+        )
+        last_message_at = (
+            select(func.max(Message.created_at))
+            .where(Message.conversation_id == Conversation.id)
+            .scalar_subquery()
+        )
+        query = (
+            select(Conversation, message_count, last_message_at)
+            .where(Conversation.project_id == project_id)
+            .order_by(Conversation.created_at.desc(), Conversation.id.desc())
+        )
+        if cursor:
+            created_at, conversation_id = decode_cursor(cursor)
+            query = query.where(or_(
+                Conversation.created_at < created_at,
+                and_(Conversation.created_at == created_at, Conversation.id < conversation_id),
+            ))
+        rows = list((await self.session.execute(query.limit(limit + 1))).all())
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1][0]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return [tuple(row) for row in rows], next_cursor
+
     async def get_messages(self, conversation_id: UUID) -> list[Message]:
         result = await self.session.execute(
             select(Message)
@@ -55,7 +89,5 @@ class ConversationService:
         return conversation
 
     async def delete(self, conversation_id: UUID) -> None:
-        conversation = await self.session.get(Conversation, conversation_id)
-        if conversation:
-            await self.session.delete(conversation)
-            await self.session.commit()
+        await self.session.execute(delete(Conversation).where(Conversation.id == conversation_id))
+        await self.session.commit()
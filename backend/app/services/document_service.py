@@ -1,37 +1,133 @@
+import asyncio
+import itertools
+import logging
 import uuid
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+from app.config.settings import settings
 from app.services.file_parser import FileParser
-from app.services.chunker import Chunker
+from app.services.chunker import Chunker, StreamingChunker, TextChunk
+from app.services.text_cache import ParsedTextCache, file_hash
 from app.core.base_embedder import BaseEmbedder
 from app.core.base_vector_store import BaseVectorStore, Chunk
+from app.services.profiler import profile_target
+
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = 64
+
+
+@dataclass
+class IngestLimits:
+    # Le parsing (CPU) et l'embedding (Ollama) ont chacun leur propre limite de concurrence
+    parse: asyncio.Semaphore
+    embed: asyncio.Semaphore
+
+    @classmethod
+    def from_settings(cls) -> "IngestLimits":
+        return cls(
+            asyncio.Semaphore(settings.ingest_parse_concurrency),
+            asyncio.Semaphore(settings.ingest_embed_concurrency),
+        )
+
+
+def _take(pieces: Iterator, size: int) -> list:
+    return list(itertools.islice(pieces, size))
 
 
 class DocumentService:
 
-    def __init__(self, embedder: BaseEmbedder, store: BaseVectorStore):
+    def __init__(self, embedder: BaseEmbedder, store: BaseVectorStore, chunk_size: int | None = None, chunk_overlap: int | None = None, text_cache: ParsedTextCache | None = None, limits: IngestLimits | None = None):
+        chunk_size = chunk_size or settings.chunk_size
+        chunk_overlap = settings.chunk_overlap if chunk_overlap is None else chunk_overlap
         self.parser = FileParser()
-        self.chunker = Chunker()
+        self.chunker = Chunker(chunk_size, chunk_overlap)
+        self.streaming_chunker = StreamingChunker(chunk_size, chunk_overlap)
         self.embedder = embedder
         self.store = store
+        self.text_cache = text_cache
+        self.limits = limits or IngestLimits.from_settings()
 
+    def _pages(self, file_path: str) -> tuple[str | None, Iterable[tuple[int, str]]]:
+        if self.text_cache is None:
+            return None, self.parser.iter_pages(file_path)
+        # Un fichier deja vu n'est pas parse une seconde fois
+        digest = file_hash(file_path)
+        cached = self.text_cache.get(digest)
+        if cached is not None:
+            return digest, cached
+        return digest, self.text_cache.store(digest, self.parser.iter_pages(file_path))
+
+    def _chunk(self, segments: Iterable[tuple[int, str]]) -> Iterator[TextChunk | str]:
+        # Generateur : le decoupage ne commence qu'au premier lot demande, dans un thread
+        if settings.streaming_chunker:
+            yield from self.streaming_chunker.chunk_pages(segments)
+        else:
+            yield from self.chunker.chunk("".join(text for _, text in segments))
+
+    @profile_target("upload", lambda self: getattr(self.store, "collection_name", None))
     async def upload(self, file_path: str, filename: str) -> dict:
-        document_id = str(uuid.uuid4())
+        return await self.ingest(file_path, filename)
 
-        text = self.parser.parse(file_path)
-        texts = self.chunker.chunk(text)
-        embeddings = await self.embedder.embed_batch(texts)
+    async def _next_batch(self, pieces: Iterator[TextChunk | str]) -> list[TextChunk | str]:
+        async with self.limits.parse:
+            return await asyncio.to_thread(_take, pieces, EMBED_BATCH_SIZE)
 
-        chunks = [
-            Chunk(
-                text=t,
+    async def _flush(self, document_id: str, filename: str, batch: list[TextChunk | str], offset: int, content_hash: str | None) -> None:
+        async with self.limits.embed:
+            embeddings = await self.embedder.embed_batch([
+                piece.text if isinstance(piece, TextChunk) else piece for piece in batch
+            ])
+        chunks = []
+        for i, (piece, e) in enumerate(zip(batch, embeddings)):
+            metadata = {"document_id": document_id, "filename": filename, "chunk_index": offset + i}
+            if content_hash:
+                metadata["content_hash"] = content_hash
+            if isinstance(piece, TextChunk):
+                metadata.update(page=piece.page, start=piece.start, end=piece.end)
+            chunks.append(Chunk(
+                text=piece.text if isinstance(piece, TextChunk) else piece,
                 embedding=e,
-                metadata={"document_id": document_id, "filename": filename, "chunk_index": i},
-            )
-            for i, (t, e) in enumerate(zip(texts, embeddings))
-        ]
-
+                metadata=metadata,
+            ))
         await self.store.add_documents(chunks)
 
-        return {"document_id": document_id, "filename": filename, "chunks_count": len(chunks)}
+    async def _index(self, document_id: str, filename: str, pieces: Iterable[TextChunk | str], content_hash: str | None = None) -> int:
+        # Le lot suivant est decoupe pendant l'embedding du lot courant : au plus deux lots en memoire
+        pieces = iter(pieces)
+        count = 0
+        pending = asyncio.ensure_future(self._next_batch(pieces))
+        try:
+            while batch := await pending:
+                pending = asyncio.ensure_future(self._next_batch(pieces))
+                await self._flush(document_id, filename, batch, count, content_hash)
+                count += len(batch)
+        except BaseException:
+            # Pas de document a moitie indexe : les lots deja ecrits sont retires
+            try:
+                await self.store.delete_document(document_id)
+            except Exception as e:
+                logger.error("Nettoyage du document %s echoue: %s", document_id, e)
+            raise
+        finally:
+            # Le thread de decoupage doit avoir rendu le generateur avant qu'il soit abandonne
+            await asyncio.gather(pending, return_exceptions=True)
+        return count
+
+    async def ingest(self, file_path: str, filename: str) -> dict:
+        document_id = str(uuid.uuid4())
+        async with self.limits.parse:
+            digest, segments = await asyncio.to_thread(self._pages, file_path)
+        count = await self._index(document_id, filename, self._chunk(segments), digest)
+        return {"document_id": document_id, "filename": filename, "chunks_count": count}
+
+    async def reindex(self, document_id: str, filename: str, content_hash: str) -> int | None:
+        # Redecoupe un document a partir du texte en cache, sans relire le fichier
+        segments = self.text_cache.get(content_hash) if self.text_cache else None
+        if segments is None:
+            return None
+        return await self._index(document_id, filename, self._chunk(segments), content_hash)
 
     async def list_documents(self) -> list[dict]:
         return await self.store.list_documents()
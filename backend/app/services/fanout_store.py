@@ -0,0 +1,66 @@
+import asyncio
+import heapq
+import logging
+from itertools import islice
+from app.core.base_vector_store import BaseVectorReader, Chunk, MetadataFilter
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_distance(score: float, space: str) -> float:
+    # Ramene chaque metrique a l'echelle L2 au carre sur vecteurs unitaires (0 a 4)
+    if space in ("cosine", "ip"):
+        return 2 * score
+    return score
+
+
+class FanoutVectorStore(BaseVectorReader):
+
+    def __init__(self, stores: dict[str, BaseVectorReader], max_concurrency: int = 8, shard_timeout: float = 2.0):
+        self.stores = stores
+        self.max_concurrency = max_concurrency
+        self.shard_timeout = shard_timeout
+
+    async def _query_shard(self, semaphore: asyncio.Semaphore, name: str, store: BaseVectorReader, embedding: list[float], top_k: int, filter: MetadataFilter | None) -> list[Chunk]:
+        async with semaphore:
+            try:
+                chunks = await asyncio.wait_for(store.query(embedding, top_k=top_k, filter=filter), timeout=self.shard_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Recherche fan-out: timeout sur %s", name)
+                return []
+            except Exception as e:
+                logger.warning("Recherche fan-out: echec sur %s: %s", name, e)
+                return []
+        for chunk in chunks:
+            chunk.score = normalize_distance(chunk.score, store.distance_space)
+            chunk.metadata = {**chunk.metadata, "collection": name}
+        return sorted(chunks, key=lambda chunk: chunk.score)
+
+    async def get_embed_model(self) -> str:
+        models = set(await asyncio.gather(*(store.get_embed_model() for store in self.stores.values())))
+        if len(models) != 1:
+            raise ValueError("Les collections n'utilisent pas un unique modele d'embedding")
+        return models.pop()
+
+    async def query(self, embedding: list[float], top_k: int = 5, filter: MetadataFilter | None = None) -> list[Chunk]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        shards = await asyncio.gather(*(
+            self._query_shard(semaphore, name, store, embedding, top_k, filter)
+            for name, store in self.stores.items()
+        ))
+        return list(islice(heapq.merge(*shards, key=lambda chunk: chunk.score), top_k))
+
+    async def list_documents(self) -> list[dict]:
+        shards = await asyncio.gather(*(store.list_documents() for store in self.stores.values()))
+        return [
+            {**document, "collection": name}
+            for name, documents in zip(self.stores, shards)
+            for document in documents
+        ]
+
+    async def iter_chunks(self, batch_size: int = 1000):
+        for name, store in self.stores.items():
+            async for batch in store.iter_chunks(batch_size):
+                for chunk in batch:
+                    chunk.metadata = {**chunk.metadata, "collection": name}
+                yield batch
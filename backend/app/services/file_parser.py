@@ -1,6 +1,7 @@
 from pathlib import Path
-import fitz
-from docx import Document
+from typing import Iterator
+
+TEXT_BLOCK_SIZE = 1024 * 1024
 
 
 class FileParser:
@@ -22,7 +23,48 @@ class FileParser:
 
         return parser(path)
 
+    def iter_pages(self, file_path: str) -> Iterator[tuple[int, str]]:
+        path = Path(file_path)
+        extension = path.suffix.lower()
+
+        parsers = {
+            ".pdf": self._iter_pdf,
+            ".docx": self._iter_docx,
+            ".txt": self._iter_text,
+            ".md": self._iter_text,
+        }
+
+        parser = parsers.get(extension)
+        if parser is None:
+            raise ValueError(f"Format non supporte : {extension}")
+
+        return parser(path)
+
+    def _iter_pdf(self, path: Path) -> Iterator[tuple[int, str]]:
+        import fitz
+
+        doc = fitz.open(str(path))
+        try:
+            for number, page in enumerate(doc, start=1):
+                yield number, page.get_text()
+        finally:
+            doc.close()
+
+    def _iter_docx(self, path: Path) -> Iterator[tuple[int, str]]:
+        from docx import Document
+
+        doc = Document(str(path))
+        for i, paragraph in enumerate(doc.paragraphs):
+            yield 1, ("\n" if i else "") + paragraph.text
+
+    def _iter_text(self, path: Path) -> Iterator[tuple[int, str]]:
+        with open(path, encoding="utf-8") as f:
+            while block := f.read(TEXT_BLOCK_SIZE):
+                yield 1, block
+
     def _parse_pdf(self, path: Path) -> str:
+        import fitz
+
         doc = fitz.open(str(path))
         text = ""
         for page in doc:
@@ -31,6 +73,8 @@ class FileParser:
         return text
 
     def _parse_docx(self, path: Path) -> str:
+        from docx import Document
+
         doc = Document(str(path))
         return "\n".join(p.text for p in doc.paragraphs)
 
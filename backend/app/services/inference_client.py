@@ -0,0 +1,96 @@
+import asyncio
+import io
+import wave
+from pathlib import Path
+import numpy as np
+from app.core.base_stt import BaseSTT
+from app.core.base_tts import BaseTTS
+from app.services.inference_ipc import InferenceError, create_segment, read_message, read_segment, release_segment, write_message
+
+
+def encode_wav(audio: np.ndarray, sample_rate: int = 16000) -> bytes:
+    # Format attendu par decode_wav cote worker : PCM 16 bits mono
+    samples = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class InferenceClient:
+
+    def __init__(self, path: str, timeout: float = 120.0):
+        self.path = path
+        self.timeout = timeout
+
+    async def call(self, message: dict, payload: bytes | None = None) -> dict:
+        # Une connexion par requete : le worker libere les segments qu'il a crees a la fermeture
+        segment = create_segment(payload) if payload is not None else None
+        try:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError as e:
+                raise InferenceError(f"Worker d'inference injoignable ({self.path}): {e}") from e
+            try:
+                if segment is not None:
+                    message = {**message, "shm": segment.name, "size": len(payload)}
+                await write_message(writer, message)
+                response = await asyncio.wait_for(read_message(reader), timeout=self.timeout)
+                if response is None:
+                    raise InferenceError("Le worker d'inference a ferme la connexion")
+                if not response.get("ok"):
+                    raise InferenceError(response.get("error", "Erreur du worker d'inference"))
+                if "shm" in response:
+                    response["payload"] = read_segment(response["shm"], response["size"])
+                return response
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+        finally:
+            if segment is not None:
+                release_segment(segment)
+
+    async def ping(self) -> bool:
+        try:
+            await self.call({"op": "ping"})
+        except InferenceError:
+            return False
+        return True
+
+
+class RemoteSTT(BaseSTT):
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    async def load(self) -> None:
+        # Les modeles sont charges par le worker : on verifie seulement qu'il repond
+        await self.client.call({"op": "ping"})
+
+    async def transcribe(self, audio_path: str) -> str:
+        audio = await asyncio.to_thread(Path(audio_path).read_bytes)
+        response = await self.client.call({"op": "transcribe"}, audio)
+        return response["text"]
+
+    async def transcribe_audio(self, audio: np.ndarray) -> str:
+        response = await self.client.call({"op": "transcribe"}, await asyncio.to_thread(encode_wav, audio))
+        return response["text"]
+
+
+class RemoteTTS(BaseTTS):
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    async def load(self) -> None:
+        await self.client.call({"op": "ping"})
+
+    async def synthesize(self, text: str) -> tuple[bytes, int]:
+        response = await self.client.call({"op": "synthesize", "text": text})
+        return response["payload"], response["sample_rate"]
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import struct
+import sys
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+# Trame : longueur (4 octets, big-endian) puis un objet JSON ; l'audio ne passe jamais par le socket
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 1024 * 1024
+
+
+class InferenceError(RuntimeError):
+    pass
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict | None:
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise InferenceError(f"Message trop long ({size} octets)")
+    return json.loads(await reader.readexactly(size))
+
+
+async def write_message(writer: asyncio.StreamWriter, message: dict) -> None:
+    body = json.dumps(message).encode()
+    writer.write(HEADER.pack(len(body)) + body)
+    await writer.drain()
+
+
+def create_segment(data: bytes) -> SharedMemory:
+    segment = SharedMemory(create=True, size=max(len(data), 1))
+    segment.buf[:len(data)] = data
+    return segment
+
+
+def read_segment(name: str, size: int) -> bytes:
+    if sys.version_info >= (3, 13):
+        segment = SharedMemory(name=name, track=False)
+    else:
+        segment = SharedMemory(name=name)
+        # Avant 3.13, s'attacher a un segment l'inscrit aupres du resource_tracker,
+        # qui le supprimerait a la sortie du processus alors qu'il appartient a l'autre
+        resource_tracker.unregister(segment._name, "shared_memory")
+    try:
+        return bytes(segment.buf[:size])
+    finally:
+        segment.close()
+
+
+def release_segment(segment: SharedMemory) -> None:
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
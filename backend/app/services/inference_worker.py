@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import io
+import logging
+import os
+import signal
+import wave
+import numpy as np
+from app.config.settings import settings
+from app.core.base_stt import BaseSTT
+from app.core.base_tts import BaseTTS
+from app.services.inference_ipc import InferenceError, create_segment, read_message, read_segment, release_segment, write_message
+
+logger = logging.getLogger(__name__)
+
+# Whisper n'accepte que du 16 kHz : le reechantillonnage est fait par ffmpeg en amont
+STT_SAMPLE_RATE = 16000
+
+
+def decode_wav(data: bytes) -> np.ndarray:
+    # ffmpeg produit du PCM 16 bits mono a 16 kHz
+    with wave.open(io.BytesIO(data)) as f:
+        if f.getsampwidth() != 2:
+            raise InferenceError("WAV attendu en PCM 16 bits")
+        if f.getframerate() != STT_SAMPLE_RATE:
+            raise InferenceError(f"WAV attendu a {STT_SAMPLE_RATE} Hz, recu {f.getframerate()} Hz")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+        if f.getnchannels() > 1:
+            samples = samples.reshape(-1, f.getnchannels()).mean(axis=1)
+    return samples.astype(np.float32) / 32768.0
+
+
+class InferenceWorker:
+
+    def __init__(self, stt: BaseSTT, tts: BaseTTS):
+        self.stt = stt
+        self.tts = tts
+        # Un seul appel a la fois par modele, quel que soit le nombre de workers de l'API
+        self._stt_lock = asyncio.Lock()
+        self._tts_lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        await asyncio.gather(self.stt.load(), self.tts.load())
+
+    async def _transcribe(self, message: dict) -> dict:
+        audio = decode_wav(read_segment(message["shm"], message["size"]))
+        async with self._stt_lock:
+            text = await self.stt.transcribe_audio(audio)
+        return {"ok": True, "text": text}
+
+    async def _synthesize(self, message: dict, segments: list) -> dict:
+        async with self._tts_lock:
+            audio, sample_rate = await self.tts.synthesize(message["text"])
+        segment = create_segment(audio)
+        segments.append(segment)
+        return {"ok": True, "shm": segment.name, "size": len(audio), "sample_rate": sample_rate}
+
+    async def _dispatch(self, message: dict, segments: list) -> dict:
+        op = message.get("op")
+        if op == "transcribe":
+            return await self._transcribe(message)
+        if op == "synthesize":
+            return await self._synthesize(message, segments)
+        if op == "ping":
+            return {"ok": True}
+        raise InferenceError(f"Operation inconnue : {op}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        segments = []
+        try:
+            while (message := await read_message(reader)) is not None:
+                try:
+                    response = await self._dispatch(message, segments)
+                except Exception as e:
+                    logger.error("Requete %s echouee: %s", message.get("op"), e)
+                    response = {"ok": False, "error": str(e)}
+                await write_message(writer, response)
+        except (ConnectionError, EOFError, InferenceError, ValueError) as e:
+            logger.warning("Connexion interrompue: %s", e)
+        finally:
+            # Le client a copie l'audio avant de fermer la connexion
+            for segment in segments:
+                release_segment(segment)
+            writer.close()
+
+
+async def serve(worker: InferenceWorker, path: str) -> None:
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(worker.handle, path)
+    os.chmod(path, 0o660)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info("Worker d'inference a l'ecoute sur %s", path)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+async def run(path: str, preload: bool) -> None:
+    from app.services.mlx_stt import MlxSTT
+    from app.services.mlx_tts import MlxTTS
+
+    worker = InferenceWorker(MlxSTT(), MlxTTS())
+    if preload:
+        await worker.load()
+    await serve(worker, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker d'inference : Whisper et Kokoro charges une seule fois pour tous les workers de l'API")
+    parser.add_argument("--socket", default=settings.inference_socket)
+    parser.add_argument("--no-preload", action="store_true", help="Charge les modeles a la premiere requete")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.socket, not args.no_preload))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import numpy as np
+
+BLOCK_ROWS = 4096
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = vectors[start:start + BLOCK_ROWS]
+        assignments[start:start + BLOCK_ROWS] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+
+def kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, init: np.ndarray | None = None, seed: int = 0) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    if init is not None and len(init) == n_lists:
+        centroids = init.astype(np.float32, copy=True)
+    else:
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_lists)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Une liste vide est reinitialisee sur un point tire au hasard
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_size: int):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_size = trained_size
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def appended(self, vectors: np.ndarray) -> "IVFIndex":
+        assignments = np.concatenate([self.assignments, nearest_centroids(vectors, self.centroids)])
+        return IVFIndex(self.centroids, assignments, self.trained_size)
+
+    def filtered(self, mask: np.ndarray) -> "IVFIndex":
+        return IVFIndex(self.centroids, self.assignments[mask], self.trained_size)
+
+    def probe(self, query: np.ndarray, nprobe: int, rows: np.ndarray | None = None, min_rows: int = 0) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32)
+        distances = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2 * self.centroids @ query
+        if rows is None:
+            nprobe = min(nprobe, self.n_lists)
+            closest = np.argpartition(distances, nprobe - 1)[:nprobe]
+            return np.sort(np.concatenate([self.lists[i] for i in closest]))
+        # Avec un filtre, seules les listes contenant des lignes retenues sont sondees, au moins
+        # assez pour reunir min_rows lignes : un filtre selectif ne vide pas le sondage
+        row_lists = self.assignments[rows]
+        candidates = np.unique(row_lists)
+        order = candidates[np.argsort(distances[candidates])]
+        counts = np.cumsum(np.bincount(row_lists, minlength=self.n_lists)[order])
+        needed = max(nprobe, int(np.searchsorted(counts, min_rows)) + 1)
+        return rows[np.isin(row_lists, order[:needed])]
+
+
+def default_n_lists(size: int) -> int:
+    return max(1, int(np.sqrt(size)))
+
+
+def default_nprobe(n_lists: int) -> int:
+    # Environ 6 % des listes : le nombre de listes croit avec la collection, le sondage aussi
+    return min(n_lists, max(8, n_lists // 16))
+
+
+def train_centroids(sample: np.ndarray, n_lists: int, init: np.ndarray | None = None) -> np.ndarray:
+    n_lists = max(1, min(n_lists, len(sample)))
+    # Un reentrainement part des centroides existants et converge en quelques iterations
+    iterations = 4 if init is not None and len(init) == n_lists else 10
+    return kmeans(sample, n_lists, iterations=iterations, init=init)
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from uuid import UUID
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import delete, update
+from app.config.database import async_session
+from app.config.settings import settings
+from app.models.database import ProjectJob, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+def _stale_before():
+    return utcnow() - timedelta(seconds=settings.job_lock_timeout)
+
+
+async def active_job(project_id: UUID) -> ProjectJob | None:
+    async with async_session() as session:
+        job = await session.get(ProjectJob, project_id)
+    if job is None or job.heartbeat_at < _stale_before():
+        return None
+    return job
+
+
+async def acquire(project_id: UUID, kind: str) -> bool:
+    # La cle primaire sur project_id arbitre entre les workers : un seul job par projet
+    async with async_session() as session:
+        await session.execute(
+            delete(ProjectJob).where(ProjectJob.project_id == project_id, ProjectJob.heartbeat_at < _stale_before())
+        )
+        session.add(ProjectJob(project_id=project_id, kind=kind))
+        try:
+            await session.commit()
+        except IntegrityError:
+            return False
+    return True
+
+
+async def release(project_id: UUID) -> None:
+    async with async_session() as session:
+        await session.execute(delete(ProjectJob).where(ProjectJob.project_id == project_id))
+        await session.commit()
+
+
+async def _heartbeat(project_id: UUID) -> None:
+    while True:
+        await asyncio.sleep(settings.job_heartbeat_interval)
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(ProjectJob).where(ProjectJob.project_id == project_id).values(heartbeat_at=utcnow())
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning("Battement du job de %s echoue: %s", project_id, e)
+
+
+@asynccontextmanager
+async def held(project_id: UUID):
+    # Garde le verrou pris par acquire() pendant le job, puis le libere
+    heartbeat = asyncio.create_task(_heartbeat(project_id))
+    try:
+        yield
+    finally:
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        try:
+            await release(project_id)
+        except Exception as e:
+            logger.error("Verrou du job de %s non libere: %s", project_id, e)
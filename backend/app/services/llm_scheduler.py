@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from app.config.settings import settings
+
+PRIORITY_VOICE = 0
+PRIORITY_CHAT = 1
+PRIORITY_BATCH = 2
+
+
+class LLMBusyError(RuntimeError):
+    pass
+
+
+class Ticket:
+
+    def __init__(self, scheduler: "LLMScheduler", model: str, priority: int, seq: int):
+        self.scheduler = scheduler
+        self.model = model
+        self.key = (priority, seq)
+        self.granted = False
+        self.released = False
+        self._changed = asyncio.Event()
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return self.key < other.key
+
+    def position(self) -> int:
+        if self.granted:
+            return 0
+        waiting = self.scheduler._queues[self.model].waiting
+        return 1 + sum(1 for ticket in waiting if ticket.key < self.key)
+
+    async def wait(self, timeout: float | None = None) -> AsyncIterator[int]:
+        # Emet la position dans la file a chaque changement, jusqu'a obtenir un creneau.
+        # Le travail de fond (reindexation) attend sans limite que les requetes interactives passent
+        loop = asyncio.get_running_loop()
+        if timeout is None and self.key[0] >= PRIORITY_BATCH:
+            deadline = None
+        else:
+            deadline = loop.time() + (self.scheduler.queue_timeout if timeout is None else timeout)
+        last = None
+        while True:
+            self._changed.clear()
+            if self.granted:
+                return
+            position = self.position()
+            if position != last:
+                last = position
+                yield position
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                self.release()
+                raise LLMBusyError(f"Delai d'attente depasse pour le modele {self.model}")
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self)
+
+
+class _ModelQueue:
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting: list[Ticket] = []
+
+
+class LLMScheduler:
+
+    def __init__(self, max_concurrency: int = 4, model_concurrency: dict[str, int] | None = None, max_queue: int = 32, queue_timeout: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._queues: dict[str, _ModelQueue] = {}
+        self._seq = itertools.count()
+
+    def _queue(self, model: str) -> _ModelQueue:
+        if model not in self._queues:
+            self._queues[model] = _ModelQueue(self.model_concurrency.get(model, self.max_concurrency))
+        return self._queues[model]
+
+    def check(self, model: str) -> None:
+        queue = self._queue(model)
+        waiting = sum(1 for ticket in queue.waiting if ticket.key[0] < PRIORITY_BATCH)
+        if queue.active >= queue.limit and waiting >= self.max_queue:
+            raise LLMBusyError(f"Trop de requetes en attente pour le modele {model}")
+
+    def enqueue(self, model: str, priority: int = PRIORITY_CHAT) -> Ticket:
+        if priority < PRIORITY_BATCH:
+            self.check(model)
+        queue = self._queue(model)
+        ticket = Ticket(self, model, priority, next(self._seq))
+        heapq.heappush(queue.waiting, ticket)
+        self._dispatch(queue)
+        return ticket
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = PRIORITY_CHAT):
+        ticket = self.enqueue(model, priority)
+        try:
+            async for _ in ticket.wait():
+                pass
+            yield
+        finally:
+            ticket.release()
+
+    def _dispatch(self, queue: _ModelQueue) -> None:
+        while queue.waiting and queue.active < queue.limit:
+            ticket = heapq.heappop(queue.waiting)
+            ticket.granted = True
+            ticket._changed.set()
+            queue.active += 1
+        for ticket in queue.waiting:
+            ticket._changed.set()
+
+    def _release(self, ticket: Ticket) -> None:
+        queue = self._queues[ticket.model]
+        if ticket.granted:
+            queue.active -= 1
+        else:
+            queue.waiting.remove(ticket)
+            heapq.heapify(queue.waiting)
+        ticket._changed.set()
+        self._dispatch(queue)
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.llm_max_concurrency,
+    model_concurrency=settings.llm_model_concurrency,
+    max_queue=settings.llm_max_queue,
+    queue_timeout=settings.llm_queue_timeout,
+)
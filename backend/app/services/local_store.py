@@ -0,0 +1,549 @@
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+import numpy as np
+from app.core.base_vector_store import LIST_OPERATORS, OPERATORS, BaseVectorStore, Chunk, MetadataFilter, matches
+from app.config.settings import settings
+from app.services.answer_cache import answer_cache
+from app.services.ivf_index import BLOCK_ROWS as IVF_BLOCK_ROWS, IVFIndex, default_n_lists, default_nprobe, nearest_centroids, train_centroids
+from app.services.quantization import QuantizedMatrix, search
+from app.services.profiler import profile_stage
+
+
+SAMPLES_PER_LIST = 64
+
+
+@dataclass
+class _Snapshot:
+    matrix: QuantizedMatrix
+    ids: list[str]
+    texts: list[str]
+    metadatas: list[dict]
+    full: np.ndarray | None
+    ivf: IVFIndex | None = None
+    document_rows: dict[str, np.ndarray] | None = None
+    columns: dict[str, np.ndarray | None] = field(default_factory=dict)
+    values: dict[str, dict | None] = field(default_factory=dict)
+    documents: int = 0
+
+
+def _first_chunks(metadatas: list[dict]) -> int:
+    # Comme pour Chroma, chaque document a exactement un chunk d'index 0
+    return sum(1 for metadata in metadatas if metadata.get("chunk_index") == 0)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _count_documents(path: Path) -> int:
+    # Lit le compteur de meta.json sans charger les vecteurs ; pour une collection ecrite
+    # avant ce compteur, ne lit que les metadonnees de records.jsonl
+    try:
+        meta = json.loads((path / "meta.json").read_text())
+    except FileNotFoundError:
+        return 0
+    if "documents" in meta:
+        return meta["documents"]
+    with open(path / "records.jsonl", encoding="utf-8") as f:
+        return _first_chunks([json.loads(line)["metadata"] for line in islice(f, meta["count"])])
+
+
+def _write_records(path: Path, mode: str, ids: list[str], texts: list[str], metadatas: list[dict]) -> None:
+    with open(path, mode, encoding="utf-8") as f:
+        for record in zip(ids, texts, metadatas):
+            f.write(json.dumps(dict(zip(("id", "text", "metadata"), record)), ensure_ascii=False) + "\n")
+
+
+# Les codes quantifies restent en memoire ; les vecteurs float32 d'origine, s'ils sont
+# conserves, restent sur disque (memmap) et ne servent qu'au re-scoring exact.
+class LocalCollection:
+
+    def __init__(self, path: Path, dtype: str, dim: int, keep_full: bool, embed_model: str | None):
+        self.path = path
+        self.dtype = dtype
+        self.dim = dim
+        self.keep_full = keep_full
+        self.embed_model = embed_model
+        self.snapshot = _Snapshot(QuantizedMatrix(dtype, dim), [], [], [], None)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._records_bytes: int | None = 0
+
+    @classmethod
+    def open(cls, path: Path, dtype: str, keep_full: bool, embed_model: str) -> "LocalCollection":
+        collection = cls(path, dtype, 0, keep_full, embed_model)
+        collection.sync()
+        return collection
+
+    def _file(self, name: str) -> Path:
+        return self.path / name
+
+    def _meta_stamp(self) -> tuple | None:
+        # meta.json est remplace a chaque ecriture (os.replace) : nouvel inode, nouvelle date
+        try:
+            stat = os.stat(self._file("meta.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        # Plusieurs workers uvicorn partagent les fichiers : un seul ecrit, et personne ne lit pendant ce temps
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self._file("lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _reload(self) -> None:
+        # Appele avec les deux verrous : relit la collection si un autre processus l'a modifiee
+        stamp = self._meta_stamp()
+        if stamp == self._stamp:
+            return
+        if stamp is None:
+            # Collection supprimee par un autre processus
+            self.dim = 0
+            self.snapshot = _Snapshot(QuantizedMatrix(self.dtype, 0), [], [], [], None)
+            self._records_bytes = 0
+        else:
+            meta = json.loads(self._file("meta.json").read_text())
+            self.dtype, self.dim, self.keep_full = meta["dtype"], meta["dim"], meta["keep_full"]
+            self.embed_model = meta.get("embed_model")
+            self._records_bytes = meta.get("records_bytes")
+            self._load(meta["count"], meta.get("ivf_trained_size"))
+        self._stamp = stamp
+
+    def _repair(self) -> None:
+        # Appele avec le verrou exclusif, avant d'ajouter aux fichiers : une ecriture interrompue
+        # (crash) laisse des donnees au-dela du compteur de meta.json, que les lecteurs ignorent
+        if not self.path.exists():
+            return
+        count = len(self.snapshot.ids)
+        for name, width in self._layout(ivf=self.snapshot.ivf is not None):
+            path = self._file(name)
+            if path.exists() and path.stat().st_size > count * width:
+                with open(path, "r+b") as f:
+                    f.truncate(count * width)
+        records = self._file("records.jsonl")
+        if not records.exists():
+            return
+        if self._records_bytes is None:
+            # meta.json ecrit avant ce compteur : position apres les lignes comptees
+            with open(records, "rb") as f:
+                for _ in range(count):
+                    f.readline()
+                self._records_bytes = f.tell()
+        if records.stat().st_size > self._records_bytes:
+            with open(records, "r+b") as f:
+                f.truncate(self._records_bytes)
+
+    def sync(self) -> None:
+        # Un stat par lecture ; le rechargement n'a lieu qu'apres une ecriture d'un autre processus
+        stamp = self._meta_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp is None:
+                self._reload()
+                return
+            with self._file_lock(exclusive=False):
+                self._reload()
+
+    def _load(self, count: int, ivf_trained_size: int | None) -> None:
+        # Lecture seule, sous verrou partage : les fichiers peuvent depasser le compteur apres un
+        # crash en cours d'ecriture, on ne lit que les lignes comptees (_repair les tronque)
+        dim = self.dim
+        codes = np.fromfile(self._file("codes.bin"), dtype=np.dtype(self.dtype), count=count * dim).reshape(count, dim)
+        scales = np.fromfile(self._file("scales.f32"), dtype=np.float32, count=count)
+        norms = np.fromfile(self._file("norms.f32"), dtype=np.float32, count=count)
+        ids, texts, metadatas = [], [], []
+        with open(self._file("records.jsonl"), "rb") as f:
+            for _ in range(count):
+                record = json.loads(f.readline())
+                ids.append(record["id"])
+                texts.append(record["text"])
+                metadatas.append(record["metadata"])
+        ivf = None
+        if ivf_trained_size:
+            centroids = np.load(self._file("centroids.npy"))
+            assignments = np.fromfile(self._file("assignments.i32"), dtype=np.int32, count=count)
+            ivf = IVFIndex(centroids, assignments, ivf_trained_size)
+        self.snapshot = _Snapshot(
+            QuantizedMatrix(self.dtype, dim, codes, scales, norms),
+            ids, texts, metadatas, self._open_full(count), ivf,
+            documents=_first_chunks(metadatas),
+        )
+
+    def _layout(self, ivf: bool) -> list[tuple[str, int]]:
+        layout = [
+            ("codes.bin", self.dim * np.dtype(self.dtype).itemsize),
+            ("scales.f32", 4),
+            ("norms.f32", 4),
+        ]
+        if self.keep_full:
+            layout.append(("full.f32", self.dim * 4))
+        if ivf:
+            layout.append(("assignments.i32", 4))
+        return layout
+
+    def _open_full(self, count: int) -> np.ndarray | None:
+        if not self.keep_full or count == 0:
+            return None
+        return np.memmap(self._file("full.f32"), dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def _write_meta(self, snapshot: _Snapshot) -> None:
+        meta = {
+            "dtype": self.dtype,
+            "dim": self.dim,
+            "keep_full": self.keep_full,
+            "embed_model": self.embed_model,
+            "count": len(snapshot.ids),
+            "documents": snapshot.documents,
+            "ivf_trained_size": snapshot.ivf.trained_size if snapshot.ivf is not None else None,
+            "records_bytes": self._file("records.jsonl").stat().st_size,
+        }
+        self._records_bytes = meta["records_bytes"]
+        tmp = self._file("meta.json.tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._file("meta.json"))
+        self._stamp = self._meta_stamp()
+
+    def _vectors(self, snapshot: _Snapshot, rows) -> np.ndarray:
+        if snapshot.full is not None:
+            return np.asarray(snapshot.full[rows], dtype=np.float32)
+        return snapshot.matrix.dequantize(rows)
+
+    def _refresh_ivf(self, snapshot: _Snapshot) -> None:
+        size = len(snapshot.ids)
+        ivf = snapshot.ivf
+        if size < settings.ivf_min_vectors:
+            snapshot.ivf = None
+            for name in ("centroids.npy", "assignments.i32"):
+                self._file(name).unlink(missing_ok=True)
+            return
+        growth = settings.ivf_retrain_growth
+        if ivf is not None and ivf.trained_size / growth < size < ivf.trained_size * growth:
+            return
+
+        n_lists = settings.ivf_lists or default_n_lists(size)
+        rng = np.random.default_rng(size)
+        sample_rows = np.sort(rng.choice(size, min(size, n_lists * SAMPLES_PER_LIST), replace=False))
+        centroids = train_centroids(
+            self._vectors(snapshot, sample_rows),
+            n_lists,
+            init=ivf.centroids if ivf is not None else None,
+        )
+        assignments = np.concatenate([
+            nearest_centroids(self._vectors(snapshot, slice(start, start + IVF_BLOCK_ROWS)), centroids)
+            for start in range(0, size, IVF_BLOCK_ROWS)
+        ])
+        snapshot.ivf = IVFIndex(centroids, assignments, size)
+        with open(self._file("centroids.npy.tmp"), "wb") as f:
+            np.save(f, centroids)
+        os.replace(self._file("centroids.npy.tmp"), self._file("centroids.npy"))
+        assignments.tofile(self._file("assignments.i32.tmp"))
+        os.replace(self._file("assignments.i32.tmp"), self._file("assignments.i32"))
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict], vectors: np.ndarray) -> None:
+        with self._lock, self._file_lock(exclusive=True):
+            self._reload()
+            self._repair()
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if self.dim == 0:
+                self.dim = vectors.shape[1]
+                self.snapshot.matrix = QuantizedMatrix(self.dtype, self.dim)
+            self.path.mkdir(parents=True, exist_ok=True)
+            old = self.snapshot
+            new = QuantizedMatrix.from_vectors(vectors, self.dtype)
+            ivf = old.ivf.appended(vectors) if old.ivf is not None else None
+            arrays = {
+                "codes.bin": new.codes,
+                "scales.f32": new.scales,
+                "norms.f32": new.norms,
+                "full.f32": vectors,
+                "assignments.i32": ivf.assignments[len(old.ids):] if ivf is not None else None,
+            }
+            for name, _ in self._layout(ivf=old.ivf is not None):
+                with open(self._file(name), "ab") as f:
+                    arrays[name].tofile(f)
+            _write_records(self._file("records.jsonl"), "a", ids, texts, metadatas)
+            count = len(old.ids) + len(ids)
+            snapshot = _Snapshot(
+                old.matrix.appended(new),
+                old.ids + ids,
+                old.texts + texts,
+                old.metadatas + metadatas,
+                self._open_full(count),
+                ivf,
+                documents=old.documents + _first_chunks(metadatas),
+            )
+            self._refresh_ivf(snapshot)
+            self._write_meta(snapshot)
+            self.snapshot = snapshot
+
+    def delete_where(self, key: str, value) -> int:
+        with self._lock, self._file_lock(exclusive=True):
+            self._reload()
+            old = self.snapshot
+            mask = np.array([metadata.get(key) != value for metadata in old.metadatas], dtype=bool)
+            removed = int((~mask).sum())
+            if removed == 0:
+                return 0
+            matrix = old.matrix.filtered(mask)
+            keep = np.flatnonzero(mask)
+            ivf = old.ivf.filtered(mask) if old.ivf is not None else None
+            arrays = {
+                "codes.bin": matrix.codes,
+                "scales.f32": matrix.scales,
+                "norms.f32": matrix.norms,
+                "full.f32": np.asarray(old.full[keep]) if old.full is not None else None,
+                "assignments.i32": ivf.assignments if ivf is not None else None,
+            }
+            for name, _ in self._layout(ivf=old.ivf is not None):
+                tmp = self._file(name + ".tmp")
+                arrays[name].tofile(tmp)
+                os.replace(tmp, self._file(name))
+            ids = [old.ids[i] for i in keep]
+            texts = [old.texts[i] for i in keep]
+            metadatas = [old.metadatas[i] for i in keep]
+            _write_records(self._file("records.jsonl.tmp"), "w", ids, texts, metadatas)
+            os.replace(self._file("records.jsonl.tmp"), self._file("records.jsonl"))
+            removed_documents = _first_chunks([old.metadatas[i] for i in np.flatnonzero(~mask)])
+            snapshot = _Snapshot(
+                matrix, ids, texts, metadatas, self._open_full(len(ids)), ivf,
+                documents=old.documents - removed_documents,
+            )
+            self._refresh_ivf(snapshot)
+            self._write_meta(snapshot)
+            self.snapshot = snapshot
+            return removed
+
+    def _document_rows(self, snapshot: _Snapshot) -> dict[str, np.ndarray]:
+        # Construit a la premiere recherche filtree, puis partage par toutes celles du meme snapshot
+        if snapshot.document_rows is None:
+            rows = defaultdict(list)
+            for row, metadata in enumerate(snapshot.metadatas):
+                rows[metadata.get("document_id")].append(row)
+            snapshot.document_rows = {document_id: np.array(r, dtype=np.int64) for document_id, r in rows.items()}
+        return snapshot.document_rows
+
+    def _filter_rows(self, snapshot: _Snapshot, filter: MetadataFilter) -> np.ndarray:
+        documents = self._document_rows(snapshot)
+        if filter.document_ids is None and filter.filenames is None:
+            rows = np.arange(len(snapshot.ids))
+        else:
+            selected = documents if filter.document_ids is None else [
+                document_id for document_id in dict.fromkeys(filter.document_ids) if document_id in documents
+            ]
+            if filter.filenames is not None:
+                # Le nom de fichier est commun a tous les chunks d'un document : un test par document
+                filenames = set(filter.filenames)
+                selected = [
+                    document_id for document_id in selected
+                    if snapshot.metadatas[documents[document_id][0]].get("filename") in filenames
+                ]
+            if not selected:
+                return np.empty(0, dtype=np.int64)
+            rows = np.sort(np.concatenate([documents[document_id] for document_id in selected]))
+        remaining = []
+        for key, op, expected in MetadataFilter(metadata=filter.metadata).conditions():
+            column = self._column(snapshot, key)
+            values = expected if op in LIST_OPERATORS else [expected]
+            if column is None or not all(_is_number(value) for value in values):
+                index = self._value_rows(snapshot, key) if op in ("$eq", "$ne") + LIST_OPERATORS else None
+                if index is None:
+                    # Comparaisons d'ordre sur des valeurs non numeriques : test ligne a ligne
+                    remaining.append((key, op, expected))
+                    continue
+                # Cles textuelles ou booleennes (auteur, langue...) : lignes retrouvees par valeur
+                targets = [index[value] for value in values if value in index]
+                matched = np.isin(rows, np.concatenate(targets)) if targets else np.zeros(len(rows), dtype=bool)
+                if op in ("$ne", "$nin"):
+                    # Comme Chroma, les lignes sans la cle sont exclues
+                    matched = ~matched & np.isin(rows, np.concatenate(list(index.values())) if index else [])
+                rows = rows[matched]
+                continue
+            # Cles numeriques (dates, annees...) : comparaison vectorisee, les absentes (NaN) sont exclues
+            selected = column[rows]
+            if op in ("$in", "$nin"):
+                keep = np.isin(selected, expected, invert=op == "$nin")
+            else:
+                keep = OPERATORS[op](selected, expected)
+            rows = rows[keep & ~np.isnan(selected)]
+        if remaining:
+            metadatas = snapshot.metadatas
+            keep = np.fromiter((matches(metadatas[row], remaining) for row in rows), dtype=bool, count=len(rows))
+            rows = rows[keep]
+        return rows
+
+    def _column(self, snapshot: _Snapshot, key: str) -> np.ndarray | None:
+        # Valeurs d'une cle de metadonnees pour toutes les lignes, si elles sont toutes numeriques
+        if key not in snapshot.columns:
+            values = [metadata.get(key) for metadata in snapshot.metadatas]
+            numeric = all(value is None or _is_number(value) for value in values)
+            snapshot.columns[key] = np.array(
+                [np.nan if value is None else value for value in values], dtype=np.float64,
+            ) if numeric else None
+        return snapshot.columns[key]
+
+    def _value_rows(self, snapshot: _Snapshot, key: str) -> dict | None:
+        # Lignes de chaque valeur d'une cle de metadonnees, construit a la premiere recherche filtree
+        if key not in snapshot.values:
+            rows = defaultdict(list)
+            for row, metadata in enumerate(snapshot.metadatas):
+                value = metadata.get(key)
+                if value is None:
+                    continue
+                if not isinstance(value, (str, int, float, bool)):
+                    rows = None
+                    break
+                rows[value].append(row)
+            snapshot.values[key] = None if rows is None else {
+                value: np.array(r, dtype=np.int64) for value, r in rows.items()
+            }
+        return snapshot.values[key]
+
+    def query(self, embedding: list[float], top_k: int, rescore_factor: int, nprobe: int | None, filter: MetadataFilter | None = None) -> list[Chunk]:
+        self.sync()
+        snapshot = self.snapshot
+        if not snapshot.ids:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        rows = None
+        if filter is not None:
+            rows = self._filter_rows(snapshot, filter)
+            if len(rows) == 0:
+                return []
+        # Un sous-ensemble filtre plus petit qu'une collection indexee est parcouru exhaustivement
+        if snapshot.ivf is not None and (rows is None or len(rows) >= settings.ivf_min_vectors):
+            rows = snapshot.ivf.probe(query, nprobe or default_nprobe(snapshot.ivf.n_lists), rows, min_rows=top_k)
+        rows, distances = search(
+            snapshot.matrix,
+            query,
+            top_k,
+            full=snapshot.full,
+            rescore_factor=rescore_factor,
+            rows=rows,
+        )
+        return [
+            Chunk(
+                text=snapshot.texts[row],
+                embedding=[],
+                metadata=snapshot.metadatas[row],
+                score=float(distance),
+                id=snapshot.ids[row],
+            )
+            for row, distance in zip(rows, distances)
+        ]
+
+
+_collections: dict[str, LocalCollection] = {}
+_collections_lock = threading.Lock()
+
+
+def _open_collection(collection_name: str, embed_model: str | None) -> LocalCollection:
+    with _collections_lock:
+        if collection_name not in _collections:
+            _collections[collection_name] = LocalCollection.open(
+                Path(settings.vector_store_dir) / collection_name,
+                settings.vector_dtype,
+                # En float32, les codes sont deja les vecteurs exacts : une copie ne servirait a rien
+                settings.vector_rescore and settings.vector_dtype != "float32",
+                embed_model or settings.ollama_embed_model,
+            )
+        return _collections[collection_name]
+
+
+class LocalVectorStore(BaseVectorStore):
+
+    def __init__(self, collection_name: str, embed_model: str | None = None):
+        self.collection_name = collection_name
+        self.embed_model = embed_model
+        self._collection = None
+
+    async def _get_collection(self) -> LocalCollection:
+        if self._collection is None:
+            self._collection = await asyncio.to_thread(_open_collection, self.collection_name, self.embed_model)
+        return self._collection
+
+    async def get_embed_model(self) -> str:
+        collection = await self._get_collection()
+        return collection.embed_model or settings.ollama_embed_model
+
+    async def recorded_embed_model(self) -> str | None:
+        collection = await self._get_collection()
+        return collection.embed_model
+
+    @profile_stage("store")
+    async def add_documents(self, chunks: list[Chunk]) -> None:
+        if not chunks:
+            return
+        collection = await self._get_collection()
+        await asyncio.to_thread(
+            collection.add,
+            [chunk.id or str(uuid.uuid4()) for chunk in chunks],
+            [chunk.text for chunk in chunks],
+            [chunk.metadata for chunk in chunks],
+            np.array([chunk.embedding for chunk in chunks], dtype=np.float32),
+        )
+        answer_cache.invalidate(self.collection_name)
+
+    @profile_stage("search")
+    async def query(self, embedding: list[float], top_k: int = 5, filter: MetadataFilter | None = None) -> list[Chunk]:
+        collection = await self._get_collection()
+        return await asyncio.to_thread(
+            collection.query, embedding, top_k, settings.vector_rescore_factor, settings.ivf_nprobe, filter,
+        )
+
+    async def delete_document(self, document_id: str) -> None:
+        collection = await self._get_collection()
+        await asyncio.to_thread(collection.delete_where, "document_id", document_id)
+        answer_cache.invalidate(self.collection_name)
+
+    async def list_documents(self) -> list[dict]:
+        collection = await self._get_collection()
+        await asyncio.to_thread(collection.sync)
+        documents = {}
+        for metadata in collection.snapshot.metadatas:
+            doc_id = metadata.get("document_id")
+            if doc_id and doc_id not in documents:
+                documents[doc_id] = metadata
+        return list(documents.values())
+
+    async def count_documents(self) -> int:
+        # Resume des projets : compte sans ouvrir la collection (codes, textes, metadonnees)
+        return await asyncio.to_thread(_count_documents, Path(settings.vector_store_dir) / self.collection_name)
+
+    async def iter_chunks(self, batch_size: int = 1000):
+        collection = await self._get_collection()
+        await asyncio.to_thread(collection.sync)
+        snapshot = collection.snapshot
+        for start in range(0, len(snapshot.ids), batch_size):
+            rows = slice(start, start + batch_size)
+            embeddings = await asyncio.to_thread(collection._vectors, snapshot, rows)
+            yield [
+                Chunk(text=text, embedding=embedding, metadata=metadata, id=chunk_id)
+                for chunk_id, text, embedding, metadata in zip(
+                    snapshot.ids[rows], snapshot.texts[rows], embeddings, snapshot.metadatas[rows],
+                )
+            ]
+
+    async def drop_collection(self) -> None:
+        with _collections_lock:
+            _collections.pop(self.collection_name, None)
+        await asyncio.to_thread(
+            shutil.rmtree, Path(settings.vector_store_dir) / self.collection_name, True,
+        )
+        answer_cache.invalidate(self.collection_name)
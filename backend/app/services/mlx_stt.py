@@ -1,7 +1,7 @@
 import asyncio
 import logging
 import threading
-from mlx_audio.stt.generate import load_model as load_stt_model
+import numpy as np
 from app.core.base_stt import BaseSTT
 from app.config.settings import settings
 
@@ -19,14 +19,23 @@ class MlxSTT(BaseSTT):
         if self._model is None:
             with self._lock:
                 if self._model is None:
+                    from mlx_audio.stt.generate import load_model as load_stt_model
+
                     logger.info("Chargement Whisper : %s", self._model_id)
                     self._model = load_stt_model(self._model_id)
         return self._model
 
-    def _transcribe_sync(self, audio_path: str) -> str:
+    def _transcribe_sync(self, audio: str | np.ndarray) -> str:
         model = self._load_model()
-        result = model.generate(audio_path, language="fr")
+        result = model.generate(audio, language="fr")
         return result.text.strip()
 
+    async def load(self) -> None:
+        await asyncio.to_thread(self._load_model)
+
     async def transcribe(self, audio_path: str) -> str:
         return await asyncio.to_thread(self._transcribe_sync, audio_path)
+
+    async def transcribe_audio(self, audio: np.ndarray) -> str:
+        # Echantillons mono a 16 kHz, deja decodes
+        return await asyncio.to_thread(self._transcribe_sync, audio)
@@ -4,7 +4,6 @@ import logging
 import threading
 import numpy as np
 import soundfile as sf
-from mlx_audio.tts.utils import load_model as load_tts_model
 from app.core.base_tts import BaseTTS
 from app.config.settings import settings
 
@@ -24,6 +23,8 @@ class MlxTTS(BaseTTS):
         if self._model is None:
             with self._lock:
                 if self._model is None:
+                    from mlx_audio.tts.utils import load_model as load_tts_model
+
                     logger.info("Chargement Kokoro : %s", self._model_id)
                     self._model = load_tts_model(self._model_id)
         return self._model
@@ -40,5 +41,8 @@ class MlxTTS(BaseTTS):
         sf.write(buffer, audio, sample_rate, format="WAV")
         return buffer.getvalue(), sample_rate
 
+    async def load(self) -> None:
+        await asyncio.to_thread(self._load_model)
+
     async def synthesize(self, text: str) -> tuple[bytes, int]:
         return await asyncio.to_thread(self._synthesize_sync, text)
@@ -1,18 +1,44 @@
-from ollama import AsyncClient
 from app.core.base_embedder import BaseEmbedder
 from app.config.settings import settings
+from app.services.llm_scheduler import LLMScheduler, PRIORITY_CHAT
+from app.services.ollama_pool import OllamaPool, is_backend_failure, ollama_pool
+from app.services.profiler import profile_stage
 
 
 class OllamaEmbedder(BaseEmbedder):
 
-    def __init__(self):
-        self.client = AsyncClient(host=settings.ollama_base_url)
-        self.model = settings.ollama_embed_model
+    def __init__(self, model: str | None = None, pool: OllamaPool | None = None, scheduler: LLMScheduler | None = None, priority: int = PRIORITY_CHAT):
+        self.pool = pool or ollama_pool
+        self.model = model or settings.ollama_embed_model
+        self.scheduler = scheduler
+        self.priority = priority
 
+    async def _embed(self, input):
+        if self.scheduler is None:
+            return await self._embed_any(input)
+        # Meme file que les generations : la reindexation passe apres le chat et la voix
+        async with self.scheduler.slot(self.model, self.priority):
+            return await self._embed_any(input)
+
+    async def _embed_any(self, input):
+        # Bascule sur le serveur suivant si celui choisi ne repond pas
+        error = None
+        for endpoint in self.pool.ordered(self.model):
+            try:
+                async with self.pool.lease(endpoint) as client:
+                    return await client.embed(model=self.model, input=input)
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                error = e
+        raise error or RuntimeError(f"Aucun serveur Ollama configure pour le modele {self.model}")
+
+    @profile_stage("embed")
     async def embed(self, text: str) -> list[float]:
-        response = await self.client.embed(model=self.model, input=text)
+        response = await self._embed(text)
         return response.embeddings[0]
 
+    @profile_stage("embed")
     async def embed_batch(self, texts: list[str]) -> list[list[float]]:
-        response = await self.client.embed(model=self.model, input=texts)
+        response = await self._embed(texts)
         return response.embeddings
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+import httpx
+from ollama import AsyncClient, ResponseError
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_backend_failure(error: Exception) -> bool:
+    # Une erreur 4xx vient de la requete (modele inconnu...) : inutile de changer de serveur
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (httpx.HTTPError, ConnectionError, asyncio.TimeoutError))
+
+
+class OllamaEndpoint:
+
+    def __init__(self, url: str, limits: httpx.Limits | None = None):
+        self.url = url
+        # Un client httpx, et donc un pool de connexions, par serveur
+        self.client = AsyncClient(host=url, limits=limits or httpx.Limits())
+        self.outstanding = 0
+        self.last_used = 0.0
+        self.healthy = True
+        self.down_until = 0.0
+        self.models: set[str] | None = None
+
+    def available(self) -> bool:
+        return self.healthy or time.monotonic() >= self.down_until
+
+
+class OllamaPool:
+
+    def __init__(self, urls: list[str], routes: dict[str, list[str]] | None = None, health_interval: float = 10.0, failure_cooldown: float = 30.0, health_timeout: float = 2.0, limits: httpx.Limits | None = None):
+        self.endpoints = [OllamaEndpoint(url.rstrip("/"), limits) for url in urls]
+        self.routes = {model: [url.rstrip("/") for url in targets] for model, targets in (routes or {}).items()}
+        self.health_interval = health_interval
+        self.failure_cooldown = failure_cooldown
+        self.health_timeout = health_timeout
+        self._health_task: asyncio.Task | None = None
+
+    def candidates(self, model: str | None = None) -> list[OllamaEndpoint]:
+        endpoints = self.endpoints
+        if model in self.routes:
+            endpoints = [endpoint for endpoint in endpoints if endpoint.url in self.routes[model]]
+        elif model:
+            # Sans route explicite, on prefere les serveurs qui ont annonce le modele
+            serving = [endpoint for endpoint in endpoints if endpoint.models is None or model in endpoint.models]
+            endpoints = serving or endpoints
+        return endpoints
+
+    def ordered(self, model: str | None = None) -> list[OllamaEndpoint]:
+        # Serveurs disponibles d'abord, puis le moins de requetes en cours, puis le moins recemment utilise
+        return sorted(self.candidates(model), key=lambda endpoint: (not endpoint.available(), endpoint.outstanding, endpoint.last_used))
+
+    def pick(self, model: str | None = None) -> OllamaEndpoint:
+        endpoints = self.ordered(model)
+        if not endpoints:
+            raise RuntimeError(f"Aucun serveur Ollama configure pour le modele {model}")
+        return endpoints[0]
+
+    @asynccontextmanager
+    async def lease(self, endpoint: OllamaEndpoint):
+        endpoint.outstanding += 1
+        endpoint.last_used = time.monotonic()
+        try:
+            yield endpoint.client
+        except Exception as e:
+            if is_backend_failure(e):
+                self.mark_failed(endpoint, e)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+
+    def mark_failed(self, endpoint: OllamaEndpoint, error: Exception) -> None:
+        if endpoint.healthy:
+            logger.warning("Serveur Ollama %s indisponible: %s", endpoint.url, error)
+        endpoint.healthy = False
+        endpoint.down_until = time.monotonic() + self.failure_cooldown
+
+    async def _check(self, endpoint: OllamaEndpoint) -> None:
+        try:
+            response = await asyncio.wait_for(endpoint.client.list(), timeout=self.health_timeout)
+        except Exception as e:
+            self.mark_failed(endpoint, e)
+            return
+        endpoint.models = {model.model for model in response.models}
+        if not endpoint.healthy:
+            logger.info("Serveur Ollama %s de nouveau disponible", endpoint.url)
+        endpoint.healthy = True
+
+    async def check_health(self) -> None:
+        await asyncio.gather(*(self._check(endpoint) for endpoint in self.endpoints))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self) -> None:
+        if self._health_task is None and len(self.endpoints) > 1:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+    def status(self) -> list[dict]:
+        return [
+            {"url": endpoint.url, "healthy": endpoint.healthy, "outstanding": endpoint.outstanding}
+            for endpoint in self.endpoints
+        ]
+
+
+ollama_pool = OllamaPool(
+    settings.ollama_base_urls or [settings.ollama_base_url],
+    routes=settings.ollama_model_routes,
+    health_interval=settings.ollama_health_interval,
+    failure_cooldown=settings.ollama_failure_cooldown,
+    limits=httpx.Limits(
+        max_connections=settings.ollama_max_connections,
+        max_keepalive_connections=settings.ollama_max_keepalive,
+    ),
+)
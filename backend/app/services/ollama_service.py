@@ -1,17 +1,30 @@
-from ollama import AsyncClient
+import asyncio
 from app.core.base_llm import BaseLLM
-from app.config.settings import settings
+from app.services.ollama_pool import OllamaPool, ollama_pool
+from app.services.profiler import profile_stage
+
+STAT_FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+
 
 class OllamaLLM(BaseLLM):
-    def __init__(self):
-        self.client = AsyncClient(host=settings.ollama_base_url)
+    def __init__(self, pool: OllamaPool | None = None):
+        self.pool = pool or ollama_pool
 
     async def list_models(self) -> list[str]:
-        response = await self.client.list()
-        return [model.model for model in response.models if "embed" not in model.model]
+        endpoints = [endpoint for endpoint in self.pool.endpoints if endpoint.available()] or self.pool.endpoints
+        responses = await asyncio.gather(*(endpoint.client.list() for endpoint in endpoints), return_exceptions=True)
+        errors = [response for response in responses if isinstance(response, Exception)]
+        if len(errors) == len(responses):
+            raise errors[0]
+        names = {}
+        for response in responses:
+            if not isinstance(response, Exception):
+                names.update((model.model, None) for model in response.models if "embed" not in model.model)
+        return list(names)
 
     async def get_model_info(self, model: str) -> dict:
-        response = await self.client.show(model)
+        async with self.pool.lease(self.pool.pick(model)) as client:
+            response = await client.show(model)
         params = {}
         if hasattr(response, "model_info") and response.model_info:
             for key, value in response.model_info.items():
@@ -21,10 +34,16 @@ class OllamaLLM(BaseLLM):
         return params
 
     async def chat(self, messages: list[dict], model: str, options: dict = None) -> str:
-        response = await self.client.chat(model=model, messages=messages, options=options or {})
+        async with self.pool.lease(self.pool.pick(model)) as client:
+            response = await client.chat(model=model, messages=messages, options=options or {})
+        self.last_stats = {field: getattr(response, field, None) for field in STAT_FIELDS}
         return response.message.content
 
+    @profile_stage("generate")
     async def chat_stream(self, messages: list[dict], model: str, options: dict = None):
-        stream = await self.client.chat(model=model, messages=messages, options=options or {}, stream=True)
-        async for chunk in stream:
-            yield chunk.message.content
+        async with self.pool.lease(self.pool.pick(model)) as client:
+            stream = await client.chat(model=model, messages=messages, options=options or {}, stream=True)
+            async for chunk in stream:
+                if chunk.done:
+                    self.last_stats = {field: getattr(chunk, field, None) for field in STAT_FIELDS}
+                yield chunk.message.content
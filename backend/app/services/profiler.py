@@ -0,0 +1,354 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+from app.config.settings import settings
+
+TOP_ALLOCATIONS = 25
+# Limites de la mesure, rappelees dans chaque rapport
+SCOPE = {
+    "memory": "process",
+    "cpu": "event_loop",
+    "notes": [
+        "Le pic memoire et les allocations couvrent tout le processus, y compris les requetes concurrentes",
+        "Le travail execute dans des threads (asyncio.to_thread, parsing, index local) n'est pas echantillonne",
+    ],
+}
+
+_current: contextvars.ContextVar["ProfileSession | None"] = contextvars.ContextVar("profile_session", default=None)
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    return f"{code.co_name} ({path.parent.name}/{path.name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    # Echantillonne la pile du thread de la boucle ; seuls comptent les echantillons ou la
+    # requete profilee s'execute, c'est-a-dire ou l'un de ses cadres racines est sur la pile.
+    # Chaque appel decore de la session en est un : les taches lancees a part (recherche
+    # anticipee du chat) sont echantillonnees aussi
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.roots: frozenset = frozenset()
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def add_root(self, frame) -> None:
+        # Remplacement plutot que mutation : le thread d'echantillonnage lit l'ensemble sans verrou
+        self.roots = self.roots | {frame}
+
+    def remove_root(self, frame) -> None:
+        self.roots = self.roots - {frame}
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            roots = self.roots
+            stack = []
+            outermost = 0
+            while frame is not None:
+                stack.append(frame)
+                if frame in roots:
+                    outermost = len(stack)
+                frame = frame.f_back
+            if not outermost:
+                continue
+            labels = [_label(frame) for frame in reversed(stack[:outermost]) if frame.f_code.co_filename != __file__]
+            self.stacks[";".join(labels)] += 1
+
+
+@dataclass
+class _OpenStage:
+    name: str
+    started: float
+    start_memory: int
+    peak: int
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    total_ms: float = 0.0
+    peak_kb: float = 0.0
+    allocated_kb: float = 0.0
+
+
+class ProfileSession:
+
+    def __init__(self, target: str, collection: str | None, interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.target = target
+        self.collection = collection
+        self.started_at = datetime.now(timezone.utc)
+        self.stages: dict[str, StageStats] = {}
+        # Autres taches de la boucle au demarrage : au-dela de zero, la memoire mesuree leur revient en partie
+        self.concurrent_tasks = len(asyncio.all_tasks()) - 1
+        self._open: list[_OpenStage] = []
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start()
+        self._baseline = tracemalloc.take_snapshot()
+        self.closed = False
+        self._root = self.enter(target)
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.sampler.start()
+
+    def enter(self, name: str) -> _OpenStage:
+        # Le pic de tracemalloc est global : on le reporte sur les etapes ouvertes avant de le remettre a zero
+        current, peak = tracemalloc.get_traced_memory()
+        for stage in self._open:
+            stage.peak = max(stage.peak, peak)
+        tracemalloc.reset_peak()
+        stage = _OpenStage(name, time.perf_counter(), current, current)
+        self._open.append(stage)
+        return stage
+
+    def leave(self, stage: _OpenStage) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        for opened in self._open:
+            opened.peak = max(opened.peak, peak)
+        self._open.remove(stage)
+        stats = self.stages.setdefault(stage.name, StageStats())
+        stats.calls += 1
+        stats.total_ms += (time.perf_counter() - stage.started) * 1000
+        stats.peak_kb = max(stats.peak_kb, (stage.peak - stage.start_memory) / 1024)
+        stats.allocated_kb += (current - stage.start_memory) / 1024
+
+    def finish(self) -> dict:
+        self.closed = True
+        self.leave(self._root)
+        self.sampler.stop()
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignored)
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        differences = snapshot.compare_to(self._baseline.filter_traces(ignored), "lineno")
+        total = self.stages[self.target]
+        return {
+            "id": self.id,
+            "target": self.target,
+            "collection": self.collection,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": total.total_ms,
+            "peak_kb": total.peak_kb,
+            "stages": {name: vars(stats) for name, stats in self.stages.items()},
+            "scope": SCOPE,
+            "concurrent_tasks": self.concurrent_tasks,
+            "cpu": {
+                "format": "folded",
+                "interval_ms": self.sampler.interval * 1000,
+                "samples": sum(self.sampler.stacks.values()),
+                "stacks": dict(self.sampler.stacks.most_common()),
+            },
+            "allocations": [
+                {
+                    "location": f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+                    "size_kb": difference.size_diff / 1024,
+                    "count": difference.count_diff,
+                }
+                for difference in differences[:TOP_ALLOCATIONS]
+                if difference.size_diff > 0
+            ],
+        }
+
+
+class Profiler:
+
+    def __init__(self, interval: float, max_reports: int):
+        self.interval = interval
+        self.armed: dict[str, int] = {}
+        self.collection: str | None = None
+        self.active: ProfileSession | None = None
+        self.reports: deque[dict] = deque(maxlen=max_reports)
+
+    def arm(self, targets: set[str], count: int, collection: str | None = None) -> None:
+        self.armed = {target: count for target in targets}
+        self.collection = collection
+
+    def disarm(self) -> None:
+        self.armed = {}
+        self.collection = None
+
+    def claim(self, target: str, collection: str | None) -> bool:
+        # Une seule requete profilee a la fois : les suivantes attendent leur tour
+        if self.active is not None or not self.armed.get(target):
+            return False
+        if self.collection is not None and collection != self.collection:
+            return False
+        self.armed[target] -= 1
+        if not self.armed[target]:
+            del self.armed[target]
+        return True
+
+    def start(self, target: str, collection: str | None) -> ProfileSession:
+        self.active = ProfileSession(target, collection, self.interval)
+        return self.active
+
+    def finish(self, session: ProfileSession) -> None:
+        if self.active is not session:
+            return
+        try:
+            self.reports.append(session.finish())
+        finally:
+            self.active = None
+
+    def report(self, report_id: str) -> dict | None:
+        return next((report for report in self.reports if report["id"] == report_id), None)
+
+    def status(self) -> dict:
+        return {
+            "armed": self.armed,
+            "collection": self.collection,
+            "active": self.active.target if self.active else None,
+            "reports": [
+                {key: report[key] for key in ("id", "target", "collection", "started_at", "duration_ms", "peak_kb")}
+                for report in self.reports
+            ],
+        }
+
+
+profiler = Profiler(settings.profiling_interval, settings.profiling_max_reports)
+
+
+def _session() -> ProfileSession | None:
+    session = _current.get()
+    # Une tache creee pendant la session peut lui survivre
+    return None if session is None or session.closed else session
+
+
+def open_target(target: str, collection: str | None) -> ProfileSession | None:
+    # Session ouverte par un routeur avant de lancer des taches (recherche anticipee) :
+    # posee dans le contexte courant, que ces taches copient a leur creation
+    if _session() is not None or not profiler.claim(target, collection):
+        return None
+    session = profiler.start(target, collection)
+    _current.set(session)
+    return session
+
+
+def close_target(session: ProfileSession | None) -> None:
+    if session is not None:
+        profiler.finish(session)
+
+
+async def _profile_call(name: str, target: str | None, collection: str | None, call: Callable):
+    session = _session()
+    if session is not None:
+        # La cible deja ouverte par le routeur n'est pas comptee une seconde fois comme etape
+        stage = session.enter(name) if name != session.target else None
+        frame = sys._getframe()
+        session.sampler.add_root(frame)
+        try:
+            return await call()
+        finally:
+            session.sampler.remove_root(frame)
+            if stage is not None:
+                session.leave(stage)
+    if target is None or not profiler.claim(target, collection):
+        return await call()
+    session = profiler.start(target, collection)
+    session.sampler.add_root(sys._getframe())
+    token = _current.set(session)
+    try:
+        return await call()
+    finally:
+        _current.reset(token)
+        profiler.finish(session)
+
+
+async def _profile_stream(name: str, target: str | None, collection: str | None, stream):
+    session = _session()
+    if session is not None:
+        stage = session.enter(name) if name != session.target else None
+        frame = sys._getframe()
+        session.sampler.add_root(frame)
+        try:
+            async with aclosing(stream):
+                async for item in stream:
+                    yield item
+        finally:
+            session.sampler.remove_root(frame)
+            if stage is not None:
+                session.leave(stage)
+        return
+    if target is None or not profiler.claim(target, collection):
+        async with aclosing(stream):
+            async for item in stream:
+                yield item
+        return
+    session = profiler.start(target, collection)
+    session.sampler.add_root(sys._getframe())
+    # Un generateur s'execute dans le contexte de celui qui l'itere : pas de reset possible
+    _current.set(session)
+    try:
+        async with aclosing(stream):
+            async for item in stream:
+                yield item
+    finally:
+        _current.set(None)
+        profiler.finish(session)
+
+
+def _wrap(name: str, target: str | None, collection: Callable | None):
+    def decorator(fn):
+        # Sans profilage en cours ni arme, l'appel d'origine est renvoye tel quel
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            def stream_wrapper(self, *args, **kwargs):
+                if not (_session() or target in profiler.armed):
+                    return fn(self, *args, **kwargs)
+                return _profile_stream(name, target, collection(self) if collection else None, fn(self, *args, **kwargs))
+            return stream_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            def call_wrapper(self, *args, **kwargs):
+                if not (_session() or target in profiler.armed):
+                    return fn(self, *args, **kwargs)
+                return _profile_call(name, target, collection(self) if collection else None, lambda: fn(self, *args, **kwargs))
+            return call_wrapper
+
+        @functools.wraps(fn)
+        def sync_wrapper(self, *args, **kwargs):
+            session = _session()
+            if session is None:
+                return fn(self, *args, **kwargs)
+            stage = session.enter(name)
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                session.leave(stage)
+        return sync_wrapper
+
+    return decorator
+
+
+def profile_target(target: str, collection: Callable | None = None):
+    return _wrap(target, target, collection)
+
+
+def profile_stage(name: str):
+    return _wrap(name, None, None)
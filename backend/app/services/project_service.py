@@ -1,7 +1,8 @@
 from uuid import UUID, uuid4
-from sqlmodel import select
+from sqlmodel import and_, delete, func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.database import Project
+from app.models.database import Conversation, Project
+from app.services.pagination import decode_cursor, encode_cursor
 
 
 class ProjectService:
@@ -20,12 +21,34 @@ class ProjectService:
         await self.session.refresh(project)
         return project
 
-    async def list_all(self) -> list[Project]:
-        result = await self.session.execute(
-            select(Project).order_by(Project.created_at.desc())
-        )
+    async def list_all(self, project_ids: list[UUID] | None = None) -> list[Project]:
+        query = select(Project).order_by(Project.created_at.desc())
+        if project_ids is not None:
+            query = query.where(Project.id.in_(project_ids))
+        result = await self.session.execute(query)
         return list(result.scalars().all())
 
+    async def list_page(self, limit: int = 50, cursor: str | None = None) -> tuple[list[tuple[Project, int]], str | None]:
+        conversation_count = (
+            select(func.count(Conversation.id))
+            .where(Conversation.project_id == Project.id)
+            .scalar_subquery()
+        )
+        query = select(Project, conversation_count).order_by(Project.created_at.desc(), Project.id.desc())
+        if cursor:
+            created_at, project_id = decode_cursor(cursor)
+            query = query.where(or_(
+                Project.created_at < created_at,
+                and_(Project.created_at == created_at, Project.id < project_id),
+            ))
+        rows = list((await self.session.execute(query.limit(limit + 1))).all())
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1][0]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return [(project, count) for project, count in rows], next_cursor
+
     async def get(self, project_id: UUID) -> Project | None:
         return await self.session.get(Project, project_id)
 
@@ -42,8 +65,17 @@ class ProjectService:
         await self.session.refresh(project)
         return project
 
+    async def switch_collection(self, project_id: UUID, source: str, target: str) -> bool:
+        # Ne bascule que si le projet pointe toujours sur la collection source
+        result = await self.session.execute(
+            update(Project)
+            .where(Project.id == project_id, Project.collection_name == source)
+            .values(collection_name=target)
+        )
+        await self.session.commit()
+        return result.rowcount == 1
+
     async def delete(self, project_id: UUID) -> None:
-        project = await self.session.get(Project, project_id)
-        if project:
-            await self.session.delete(project)
-            await self.session.commit()
+        # Conversations et messages sont supprimes par la base (ON DELETE CASCADE)
+        await self.session.execute(delete(Project).where(Project.id == project_id))
+        await self.session.commit()
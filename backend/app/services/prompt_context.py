@@ -0,0 +1,69 @@
+import logging
+import threading
+from uuid import UUID
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import delete, select
+from app.config.database import async_session
+from app.models.database import ContextBlock
+
+logger = logging.getLogger(__name__)
+
+
+class ContextLog:
+    # En base plutot qu'en memoire : les tours d'une conversation peuvent etre servis par
+    # des workers differents de l'API, qui doivent reconstruire le meme prefixe
+
+    async def blocks(self, conversation_id: str) -> list[ContextBlock]:
+        async with async_session() as session:
+            result = await session.execute(
+                select(ContextBlock)
+                .where(ContextBlock.conversation_id == UUID(conversation_id))
+                .order_by(ContextBlock.turn)
+            )
+            return list(result.scalars().all())
+
+    async def record(self, conversation_id: str, block: ContextBlock) -> None:
+        # Un tour rejoue remplace les blocs des tours suivants
+        block.conversation_id = UUID(conversation_id)
+        async with async_session() as session:
+            await session.execute(
+                delete(ContextBlock)
+                .where(ContextBlock.conversation_id == block.conversation_id, ContextBlock.turn >= block.turn)
+            )
+            session.add(block)
+            try:
+                await session.commit()
+            except IntegrityError as e:
+                # Meme tour enregistre en parallele par une autre requete, ou conversation supprimee
+                logger.warning("Contexte du tour %d de %s non enregistre: %s", block.turn, conversation_id, e)
+
+
+class PromptStats:
+
+    def __init__(self):
+        self._totals: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, layout: str, stats: dict) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(layout, {
+                "requests": 0, "prompt_eval_count": 0, "prompt_eval_duration": 0, "eval_count": 0,
+            })
+            totals["requests"] += 1
+            for key in ("prompt_eval_count", "prompt_eval_duration", "eval_count"):
+                totals[key] += stats.get(key) or 0
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                layout: {
+                    **totals,
+                    "avg_prompt_eval_count": totals["prompt_eval_count"] / totals["requests"],
+                    "avg_prompt_eval_ms": totals["prompt_eval_duration"] / totals["requests"] / 1e6,
+                }
+                for layout, totals in self._totals.items()
+            }
+
+
+context_log = ContextLog()
+prompt_stats = PromptStats()
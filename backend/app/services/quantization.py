@@ -0,0 +1,104 @@
+import numpy as np
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+BLOCK_ROWS = 4096
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray]:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float32":
+        return vectors, np.ones(len(vectors), dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    if dtype == "int8":
+        # Quantification scalaire symetrique, une echelle par vecteur
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).clip(-127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Type de vecteur non supporte : {dtype}")
+
+
+class QuantizedMatrix:
+
+    def __init__(self, dtype: str, dim: int, codes: np.ndarray = None, scales: np.ndarray = None, norms: np.ndarray = None):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Type de vecteur non supporte : {dtype}")
+        self.dtype = dtype
+        self.dim = dim
+        self.codes = codes if codes is not None else np.empty((0, dim), dtype=np.dtype(dtype))
+        self.scales = scales if scales is not None else np.empty(0, dtype=np.float32)
+        self.norms = norms if norms is not None else np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, dtype: str) -> "QuantizedMatrix":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes, scales = quantize(vectors, dtype)
+        return cls(dtype, vectors.shape[1], codes, scales, np.einsum("ij,ij->i", vectors, vectors))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.norms.nbytes + (self.scales.nbytes if self.dtype == "int8" else 0)
+
+    def appended(self, other: "QuantizedMatrix") -> "QuantizedMatrix":
+        return QuantizedMatrix(
+            self.dtype,
+            self.dim,
+            np.concatenate([self.codes, other.codes]),
+            np.concatenate([self.scales, other.scales]),
+            np.concatenate([self.norms, other.norms]),
+        )
+
+    def filtered(self, mask: np.ndarray) -> "QuantizedMatrix":
+        return QuantizedMatrix(self.dtype, self.dim, self.codes[mask], self.scales[mask], self.norms[mask])
+
+    def dequantize(self, rows=slice(None)) -> np.ndarray:
+        vectors = self.codes[rows].astype(np.float32)
+        if self.dtype == "int8":
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+    def distances(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        # Distance L2 au carre approchee : |q|^2 + |x|^2 - 2 q.x, par blocs pour borner la memoire
+        query = np.asarray(query, dtype=np.float32)
+        codes = self.codes if rows is None else self.codes[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+        norms = self.norms if rows is None else self.norms[rows]
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS]
+            dots[start:start + BLOCK_ROWS] = block.astype(np.float32, copy=False) @ query
+        if self.dtype == "int8":
+            dots *= scales
+        return np.float32(query @ query) + norms - 2 * dots
+
+
+def exact_distances(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    diff = np.asarray(vectors, dtype=np.float32) - np.asarray(query, dtype=np.float32)
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def smallest(distances: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(distances))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(distances, k - 1)[:k]
+    return candidates[np.argsort(distances[candidates])]
+
+
+def search(matrix: QuantizedMatrix, query: np.ndarray, top_k: int, full: np.ndarray | None = None, rescore_factor: int = 4, rows: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    query = np.asarray(query, dtype=np.float32)
+    distances = matrix.distances(query, rows)
+    rescore = full is not None and matrix.dtype != "float32"
+    best = smallest(distances, top_k * rescore_factor if rescore else top_k)
+    positions = best if rows is None else rows[best]
+    if not rescore:
+        return positions, distances[best]
+    order = np.argsort(positions)
+    exact = exact_distances(full[positions[order]], query)
+    final = smallest(exact, top_k)
+    return positions[order][final], exact[final]
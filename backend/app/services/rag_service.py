@@ -1,6 +1,11 @@
 from app.core.base_llm import BaseLLM
 from app.core.base_embedder import BaseEmbedder
-from app.core.base_vector_store import BaseVectorStore
+from app.core.base_vector_store import BaseVectorStore, Chunk, MetadataFilter
+from app.services.answer_cache import AnswerCache, CachedAnswer
+from app.services.llm_scheduler import LLMScheduler, PRIORITY_CHAT
+from app.models.database import ContextBlock
+from app.services.prompt_context import ContextLog, prompt_stats
+from app.services.profiler import profile_stage, profile_target
 
 
 DEFAULT_INSTRUCTION = """Tu es HeyRAG, un assistant intelligent et polyvalent.
@@ -19,22 +24,44 @@ CONTEXT_TEMPLATE = """{instruction}
 {context}
 ---"""
 
+DOCUMENTS_TEMPLATE = """--- DOCUMENTS ---
+{context}
+---"""
+
 MAX_DISTANCE = 1.5
 
 
 class RAGService:
 
-    def __init__(self, llm: BaseLLM, embedder: BaseEmbedder, store: BaseVectorStore):
+    def __init__(self, llm: BaseLLM, embedder: BaseEmbedder, store: BaseVectorStore, cache: AnswerCache | None = None, namespace: str = "", scheduler: LLMScheduler | None = None, priority: int = PRIORITY_CHAT, layout: str = "system", context_log: ContextLog | None = None, max_distance: float = MAX_DISTANCE):
         self.llm = llm
         self.embedder = embedder
         self.store = store
+        self.cache = cache
+        self.namespace = namespace
+        self.scheduler = scheduler
+        self.priority = priority
+        self.layout = layout
+        self.context_log = context_log
+        self.max_distance = max_distance
+        self._question_embeddings: dict[str, list[float]] = {}
+
+    async def _embed_question(self, question: str) -> list[float]:
+        if question not in self._question_embeddings:
+            self._question_embeddings[question] = await self.embedder.embed(question)
+        return self._question_embeddings[question]
 
-    async def _retrieve(self, question: str, top_k: int = 5):
-        embedding = await self.embedder.embed(question)
-        chunks = await self.store.query(embedding, top_k=top_k)
-        return [chunk for chunk in chunks if chunk.score < MAX_DISTANCE]
+    async def _retrieve(self, question: str, top_k: int = 5, filter: MetadataFilter | None = None):
+        if filter is not None and filter.selects_nothing():
+            return []
+        embedding = await self._embed_question(question)
+        chunks = await self.store.query(embedding, top_k=top_k, filter=filter)
+        return [chunk for chunk in chunks if chunk.score < self.max_distance]
 
-    def _build_messages(self, question: str, chunks, conversation: list[dict] = None, instruction: str = ""):
+    @profile_stage("prompt")
+    def _build_messages(self, question: str, chunks, conversation: list[dict] = None, instruction: str = "", blocks: list[ContextBlock] | None = None):
+        if self.layout == "stable":
+            return self._build_stable_messages(question, conversation, instruction, blocks or [])
         if chunks:
             context = "\n\n".join([chunk.text for chunk in chunks])
             system_content = CONTEXT_TEMPLATE.format(
@@ -49,6 +76,52 @@ class RAGService:
         messages.append({"role": "user", "content": question})
         return messages
 
+    def _build_stable_messages(self, question: str, conversation: list[dict] = None, instruction: str = "", blocks: list[ContextBlock] = ()):
+        # Le prefixe (instruction, contexte deja montre, historique) reste identique d'un tour
+        # a l'autre : seul le contexte nouveau est ajoute apres l'historique
+        by_turn = {block.turn: block for block in blocks}
+        messages = [{"role": "system", "content": instruction or DEFAULT_INSTRUCTION}]
+        turn = 0
+        for message in conversation or []:
+            if message["role"] == "user":
+                if turn in by_turn:
+                    messages.append({"role": "system", "content": by_turn[turn].text})
+                turn += 1
+            messages.append(message)
+        if turn in by_turn:
+            messages.append({"role": "system", "content": by_turn[turn].text})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    async def _context_blocks(self, chunks, conversation: list[dict] = None, conversation_id: str | None = None) -> list[ContextBlock]:
+        # Blocs des tours precedents, plus celui des chunks pas encore montres dans la conversation
+        turn = sum(1 for message in conversation or [] if message["role"] == "user")
+        logged = self.context_log is not None and conversation_id is not None
+        blocks = [block for block in await self.context_log.blocks(conversation_id) if block.turn < turn] if logged else []
+        shown = {chunk_id for block in blocks for chunk_id in block.chunk_ids}
+        new_chunks = sorted(
+            (chunk for chunk in chunks or [] if chunk.id not in shown),
+            key=lambda chunk: (chunk.metadata.get("filename", ""), chunk.metadata.get("chunk_index", 0), chunk.id),
+        )
+        if new_chunks:
+            block = ContextBlock(
+                turn=turn,
+                chunk_ids=[chunk.id for chunk in new_chunks],
+                text=DOCUMENTS_TEMPLATE.format(context="\n\n".join(chunk.text for chunk in new_chunks)),
+            )
+            blocks.append(block)
+            if logged:
+                await self.context_log.record(conversation_id, block)
+        return blocks
+
+    async def _prepare_messages(self, question: str, chunks, conversation: list[dict] = None, instruction: str = "", conversation_id: str | None = None):
+        blocks = await self._context_blocks(chunks, conversation, conversation_id) if self.layout == "stable" else None
+        return self._build_messages(question, chunks, conversation, instruction, blocks)
+
+    def _record_stats(self) -> None:
+        if self.llm.last_stats:
+            prompt_stats.record(self.layout, self.llm.last_stats)
+
     def _extract_sources(self, chunks) -> list[dict]:
         sources = []
         seen = set()
@@ -58,20 +131,83 @@ class RAGService:
             key = f"{filename}_{chunk_index}"
             if key not in seen:
                 seen.add(key)
-                sources.append({"filename": filename, "chunk_index": chunk_index})
+                source = {"filename": filename, "chunk_index": chunk_index}
+                for field in ("page", "start", "end"):
+                    if field in chunk.metadata:
+                        source[field] = chunk.metadata[field]
+                sources.append(source)
         return sources
 
-    async def ask(self, question: str, model: str, conversation: list[dict] = None, options: dict = None, instruction: str = "") -> dict:
-        chunks = await self._retrieve(question)
-        messages = self._build_messages(question, chunks, conversation, instruction)
-        answer = await self.llm.chat(messages, model, options)
+    async def _cache_lookup(self, question: str, model: str, conversation, options, instruction, chunks, filter=None) -> CachedAnswer | None:
+        # Le cache est indexe par collection : une reponse restreinte a quelques documents n'y a pas sa place
+        if self.cache is None or conversation or filter:
+            return None
+        chunk_ids = tuple(chunk.id for chunk in chunks)
+        cached = self.cache.get(self.namespace, model, question, chunk_ids, instruction, options)
+        if cached is None and self.cache.similarity is not None:
+            embedding = await self._embed_question(question)
+            cached = self.cache.get_similar(self.namespace, model, embedding, chunk_ids, instruction, options)
+        return cached
+
+    def _cache_store(self, question: str, model: str, conversation, options, instruction, chunks, tokens: list[str], sources: list[dict], filter=None) -> None:
+        if self.cache is None or conversation or filter:
+            return
+        entry = CachedAnswer(
+            tokens=tokens,
+            sources=sources,
+            chunk_ids=tuple(chunk.id for chunk in chunks),
+            embedding=self._question_embeddings.get(question),
+        )
+        self.cache.put(self.namespace, model, question, entry, instruction, options)
+
+    async def _generate(self, messages: list[dict], model: str, options: dict = None):
+        if self.scheduler is None:
+            async for token in self.llm.chat_stream(messages, model, options):
+                yield {"type": "token", "content": token}
+            return
+        ticket = self.scheduler.enqueue(model, self.priority)
+        try:
+            async for position in ticket.wait():
+                yield {"type": "queue", "position": position}
+            async for token in self.llm.chat_stream(messages, model, options):
+                yield {"type": "token", "content": token}
+        finally:
+            ticket.release()
+
+    async def ask(self, question: str, model: str, conversation: list[dict] = None, options: dict = None, instruction: str = "", chunks: list[Chunk] | None = None, conversation_id: str | None = None, filter: MetadataFilter | None = None) -> dict:
+        if chunks is None:
+            chunks = await self._retrieve(question, filter=filter)
+        cached = await self._cache_lookup(question, model, conversation, options, instruction, chunks, filter)
+        if cached:
+            return {"answer": cached.answer, "sources": cached.sources}
+        messages = await self._prepare_messages(question, chunks, conversation, instruction, conversation_id)
+        if self.scheduler is None:
+            answer = await self.llm.chat(messages, model, options)
+        else:
+            async with self.scheduler.slot(model, self.priority):
+                answer = await self.llm.chat(messages, model, options)
+        self._record_stats()
         sources = self._extract_sources(chunks) if chunks else []
+        self._cache_store(question, model, conversation, options, instruction, chunks, [answer], sources, filter)
         return {"answer": answer, "sources": sources}
 
-    async def ask_stream(self, question: str, model: str, conversation: list[dict] = None, options: dict = None, instruction: str = ""):
-        chunks = await self._retrieve(question)
-        messages = self._build_messages(question, chunks, conversation, instruction)
+    @profile_target("chat", lambda self: self.namespace)
+    async def ask_stream(self, question: str, model: str, conversation: list[dict] = None, options: dict = None, instruction: str = "", chunks: list[Chunk] | None = None, conversation_id: str | None = None, filter: MetadataFilter | None = None):
+        if chunks is None:
+            chunks = await self._retrieve(question, filter=filter)
+        cached = await self._cache_lookup(question, model, conversation, options, instruction, chunks, filter)
+        if cached:
+            for token in cached.tokens:
+                yield {"type": "token", "content": token}
+            yield {"type": "sources", "content": cached.sources}
+            return
+        messages = await self._prepare_messages(question, chunks, conversation, instruction, conversation_id)
         sources = self._extract_sources(chunks) if chunks else []
-        async for token in self.llm.chat_stream(messages, model, options):
-            yield {"type": "token", "content": token}
+        tokens = []
+        async for event in self._generate(messages, model, options):
+            if event["type"] == "token":
+                tokens.append(event["content"])
+            yield event
+        self._record_stats()
+        self._cache_store(question, model, conversation, options, instruction, chunks, tokens, sources, filter)
         yield {"type": "sources", "content": sources}
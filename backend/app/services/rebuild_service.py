@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from uuid import UUID, uuid4
+from app.config.database import async_session
+from app.config.settings import settings
+from app.core.base_vector_store import BaseVectorStore
+from app.models.database import Project
+from app.services import job_lock
+from app.services.document_service import DocumentService, IngestLimits
+from app.services.llm_scheduler import PRIORITY_BATCH, llm_scheduler
+from app.services.ollama_embedder import OllamaEmbedder
+from app.services.project_service import ProjectService
+from app.services.text_cache import text_cache
+from app.services.vector_stores import get_vector_store, schedule_drop
+
+logger = logging.getLogger(__name__)
+
+
+class RebuildError(ValueError):
+    pass
+
+
+@dataclass
+class RebuildJob:
+    project_id: UUID
+    source_collection: str
+    target_collection: str
+    chunk_size: int
+    chunk_overlap: int
+    status: str = "pending"
+    rechunked: int = 0
+    copied: int = 0
+    error: str | None = None
+
+
+jobs: dict[UUID, RebuildJob] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+async def _copy_documents(source: BaseVectorStore, target: BaseVectorStore, document_ids: set[str]) -> None:
+    # Documents sans texte en cache (indexes avant l'activation du cache) : copies tels quels
+    async for batch in source.iter_chunks(settings.reembed_batch_size):
+        chunks = [chunk for chunk in batch if chunk.metadata.get("document_id") in document_ids]
+        if chunks:
+            await target.add_documents(chunks)
+
+
+async def _rebuild_pending(job: RebuildJob, source: BaseVectorStore, target: BaseVectorStore, service: DocumentService, done: set[str]) -> int:
+    documents = [document for document in await source.list_documents() if document.get("document_id") not in done]
+    uncached = set()
+    for document in documents:
+        document_id = document["document_id"]
+        content_hash = document.get("content_hash")
+        count = await service.reindex(document_id, document.get("filename", ""), content_hash) if content_hash else None
+        if count is None:
+            uncached.add(document_id)
+        else:
+            job.rechunked += 1
+        done.add(document_id)
+    if uncached:
+        await _copy_documents(source, target, uncached)
+        job.copied += len(uncached)
+    return len(documents)
+
+
+async def _run_rebuild(job: RebuildJob, limits: IngestLimits) -> None:
+    source = get_vector_store(job.source_collection)
+    job.status = "running"
+    target = None
+    try:
+        embed_model = await source.get_embed_model()
+        target = get_vector_store(job.target_collection, embed_model=embed_model)
+        service = DocumentService(
+            embedder=OllamaEmbedder(embed_model, scheduler=llm_scheduler if settings.llm_scheduler_enabled else None, priority=PRIORITY_BATCH),
+            store=target,
+            chunk_size=job.chunk_size,
+            chunk_overlap=job.chunk_overlap,
+            text_cache=text_cache,
+            limits=limits,
+        )
+        # Rattrape les documents ajoutes pendant la reconstruction, puis retire ceux supprimes
+        done: set[str] = set()
+        while await _rebuild_pending(job, source, target, service, done):
+            pass
+        source_documents = {document.get("document_id") for document in await source.list_documents()}
+        for document_id in done - source_documents:
+            await target.delete_document(document_id)
+
+        async with async_session() as session:
+            switched = await ProjectService(session).switch_collection(
+                job.project_id, job.source_collection, job.target_collection,
+            )
+        if not switched:
+            raise RebuildError("Le projet a ete supprime ou modifie pendant la reconstruction")
+    except Exception as e:
+        logger.error("Reconstruction de %s echouee: %s", job.source_collection, e)
+        job.status = "failed"
+        job.error = str(e)
+        if target is not None:
+            schedule_drop(job.target_collection)
+        return
+
+    job.status = "done"
+    schedule_drop(job.source_collection, delay=settings.reembed_drop_delay)
+
+
+async def run_rebuild(job: RebuildJob, limits: IngestLimits) -> None:
+    async with job_lock.held(job.project_id):
+        await _run_rebuild(job, limits)
+
+
+async def start_rebuild(project: Project, chunk_size: int, chunk_overlap: int, limits: IngestLimits) -> RebuildJob:
+    if not await job_lock.acquire(project.id, "rebuild"):
+        raise RebuildError("Une reindexation est deja en cours pour ce projet")
+    job = RebuildJob(
+        project_id=project.id,
+        source_collection=project.collection_name,
+        target_collection=f"project_{uuid4().hex[:8]}",
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    jobs[project.id] = job
+    task = asyncio.create_task(run_rebuild(job, limits))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from uuid import UUID, uuid4
+from app.config.database import async_session
+from app.config.settings import settings
+from app.core.base_embedder import BaseEmbedder
+from app.core.base_vector_store import BaseVectorStore, Chunk
+from app.models.database import Project
+from app.services import job_lock
+from app.services.project_service import ProjectService
+from app.services.llm_scheduler import PRIORITY_BATCH, llm_scheduler
+from app.services.ollama_embedder import OllamaEmbedder
+from app.services.vector_stores import get_vector_store, schedule_drop
+
+logger = logging.getLogger(__name__)
+
+
+class ReembedError(ValueError):
+    pass
+
+
+@dataclass
+class ReembedJob:
+    project_id: UUID
+    source_collection: str
+    target_collection: str
+    model: str
+    status: str = "pending"
+    processed: int = 0
+    error: str | None = None
+
+
+jobs: dict[UUID, ReembedJob] = {}
+_tasks: set[asyncio.Task] = set()
+
+
+async def _copy(chunks: list[Chunk], target: BaseVectorStore, embedder: BaseEmbedder) -> None:
+    embeddings = await embedder.embed_batch([chunk.text for chunk in chunks])
+    await target.add_documents([
+        Chunk(text=chunk.text, embedding=embedding, metadata=chunk.metadata, id=chunk.id)
+        for chunk, embedding in zip(chunks, embeddings)
+    ])
+
+
+async def _reconcile(source: BaseVectorStore, target: BaseVectorStore, embedder: BaseEmbedder) -> None:
+    # Rattrape les documents ajoutes ou supprimes dans la source pendant la copie
+    target_ids = set()
+    async for batch in target.iter_chunks(settings.reembed_batch_size):
+        target_ids.update(chunk.id for chunk in batch)
+    missing = []
+    async for batch in source.iter_chunks(settings.reembed_batch_size):
+        missing.extend(chunk for chunk in batch if chunk.id not in target_ids)
+    for start in range(0, len(missing), settings.reembed_batch_size):
+        await _copy(missing[start:start + settings.reembed_batch_size], target, embedder)
+
+    source_documents = {document.get("document_id") for document in await source.list_documents()}
+    for document in await target.list_documents():
+        if document.get("document_id") not in source_documents:
+            await target.delete_document(document["document_id"])
+
+
+async def _run_reembed(job: ReembedJob) -> None:
+    source = get_vector_store(job.source_collection)
+    target = get_vector_store(job.target_collection, embed_model=job.model)
+    embedder = OllamaEmbedder(job.model, scheduler=llm_scheduler if settings.llm_scheduler_enabled else None, priority=PRIORITY_BATCH)
+    job.status = "running"
+    try:
+        async for batch in source.iter_chunks(settings.reembed_batch_size):
+            await _copy(batch, target, embedder)
+            job.processed += len(batch)
+            await asyncio.sleep(settings.reembed_batch_delay)
+        await _reconcile(source, target, embedder)
+        async with async_session() as session:
+            switched = await ProjectService(session).switch_collection(
+                job.project_id, job.source_collection, job.target_collection,
+            )
+        if not switched:
+            raise ReembedError("Le projet a ete supprime ou modifie pendant la reindexation")
+    except Exception as e:
+        logger.error("Reindexation de %s echouee: %s", job.source_collection, e)
+        job.status = "failed"
+        job.error = str(e)
+        # Echec ou bascule perdue : la collection cible n'est referencee par aucun projet
+        schedule_drop(job.target_collection)
+        return
+
+    job.status = "done"
+    # Les requetes deja en cours peuvent encore lire l'ancienne collection
+    schedule_drop(job.source_collection, delay=settings.reembed_drop_delay)
+
+
+async def run_reembed(job: ReembedJob) -> None:
+    async with job_lock.held(job.project_id):
+        await _run_reembed(job)
+
+
+async def start_reembed(project: Project, model: str) -> ReembedJob:
+    # Un modele inconnu (collection ancienne) impose la reindexation
+    if await get_vector_store(project.collection_name).recorded_embed_model() == model:
+        raise ReembedError(f"Le projet est deja indexe avec {model}")
+    # Meme verrou que la reconstruction (rebuild_service) : un seul job par projet, tous types confondus
+    if not await job_lock.acquire(project.id, "reembed"):
+        raise ReembedError("Une reindexation est deja en cours pour ce projet")
+    job = ReembedJob(
+        project_id=project.id,
+        source_collection=project.collection_name,
+        target_collection=f"project_{uuid4().hex[:8]}",
+        model=model,
+    )
+    jobs[project.id] = job
+    task = asyncio.create_task(run_reembed(job))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
@@ -0,0 +1,134 @@
+import asyncio
+import io
+import json
+import zipfile
+import numpy as np
+from app.core.base_vector_store import BaseVectorStore, Chunk
+
+SNAPSHOT_FORMAT = "heyrag-snapshot"
+SNAPSHOT_VERSION = 1
+SHARD_SIZE = 5000
+SNAPSHOT_DTYPES = ("float32", "float16")
+SHARD_FILES = ("embeddings.npy", "ids.json", "texts.json", "metadatas.json")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _write_shard(archive: zipfile.ZipFile, index: int, chunks: list[Chunk], dtype: str) -> None:
+    prefix = f"shard-{index:05d}"
+    embeddings = np.asarray([chunk.embedding for chunk in chunks], dtype=np.dtype(dtype))
+    with archive.open(f"{prefix}/embeddings.npy", "w") as f:
+        np.save(f, embeddings)
+    columns = {
+        "ids": [chunk.id for chunk in chunks],
+        "texts": [chunk.text for chunk in chunks],
+        "metadatas": [chunk.metadata for chunk in chunks],
+    }
+    for name, values in columns.items():
+        archive.writestr(f"{prefix}/{name}.json", json.dumps(values, ensure_ascii=False))
+
+
+def _read_shard(archive: zipfile.ZipFile, index: int) -> list[Chunk]:
+    prefix = f"shard-{index:05d}"
+    with archive.open(f"{prefix}/embeddings.npy") as f:
+        embeddings = np.load(io.BytesIO(f.read())).astype(np.float32)
+    ids = json.loads(archive.read(f"{prefix}/ids.json"))
+    texts = json.loads(archive.read(f"{prefix}/texts.json"))
+    metadatas = json.loads(archive.read(f"{prefix}/metadatas.json"))
+    return [
+        Chunk(text=text, embedding=embedding, metadata=metadata, id=chunk_id)
+        for chunk_id, text, embedding, metadata in zip(ids, texts, embeddings, metadatas)
+    ]
+
+
+def _check_archive(archive: zipfile.ZipFile) -> dict:
+    # Tout est verifie avant la premiere ecriture : une archive tronquee ou corrompue n'ecrit rien
+    try:
+        manifest = json.loads(archive.read("manifest.json"))
+    except KeyError:
+        raise SnapshotError("Manifeste absent de l'archive") from None
+    except ValueError:
+        raise SnapshotError("Manifeste illisible") from None
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError("Format d'archive non reconnu")
+    names = set(archive.namelist())
+    for index in range(len(manifest.get("shards", []))):
+        if any(f"shard-{index:05d}/{name}" not in names for name in SHARD_FILES):
+            raise SnapshotError(f"Archive incomplete : shard {index} manquant")
+    try:
+        corrupted = archive.testzip()
+    except zipfile.BadZipFile:
+        corrupted = "archive"
+    if corrupted is not None:
+        raise SnapshotError(f"Archive corrompue : {corrupted}")
+    return manifest
+
+
+class SnapshotService:
+
+    def __init__(self, store: BaseVectorStore):
+        self.store = store
+
+    async def export(self, path: str, dtype: str = "float32") -> dict:
+        if dtype not in SNAPSHOT_DTYPES:
+            raise SnapshotError(f"Type de vecteur non supporte : {dtype}")
+        shards = []
+        dim = 0
+        archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED)
+        try:
+            async for batch in self.store.iter_chunks(SHARD_SIZE):
+                if not dim:
+                    dim = len(batch[0].embedding)
+                await asyncio.to_thread(_write_shard, archive, len(shards), batch, dtype)
+                shards.append(len(batch))
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "embed_model": await self.store.get_embed_model(),
+                "dim": dim,
+                "dtype": dtype,
+                "count": sum(shards),
+                "shards": shards,
+            }
+            archive.writestr("manifest.json", json.dumps(manifest))
+        finally:
+            archive.close()
+        return manifest
+
+    async def restore(self, path: str, batch_size: int = SHARD_SIZE) -> dict:
+        try:
+            archive = await asyncio.to_thread(zipfile.ZipFile, path)
+        except zipfile.BadZipFile:
+            raise SnapshotError("Archive ZIP invalide") from None
+        pending = None
+        try:
+            manifest = await asyncio.to_thread(_check_archive, archive)
+            embed_model = await self.store.get_embed_model()
+            if manifest["embed_model"] != embed_model:
+                raise SnapshotError(
+                    f"Archive creee avec {manifest['embed_model']}, modele de la collection {embed_model}"
+                )
+            # Restaurer par-dessus des chunks existants dupliquerait leurs ids
+            if await self.store.count_documents():
+                raise SnapshotError("La collection contient deja des documents : importez avec replace=true")
+
+            # Lecture du shard suivant pendant l'ecriture du shard courant
+            count = len(manifest["shards"])
+            restored = 0
+            for index in range(count):
+                if pending is None:
+                    pending = asyncio.create_task(asyncio.to_thread(_read_shard, archive, index))
+                chunks = await pending
+                pending = None
+                if index + 1 < count:
+                    pending = asyncio.create_task(asyncio.to_thread(_read_shard, archive, index + 1))
+                for start in range(0, len(chunks), batch_size):
+                    await self.store.add_documents(chunks[start:start + batch_size])
+                restored += len(chunks)
+            return {"count": restored, "embed_model": manifest["embed_model"], "dim": manifest["dim"]}
+        finally:
+            if pending is not None:
+                await asyncio.gather(pending, return_exceptions=True)
+            archive.close()
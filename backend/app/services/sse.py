@@ -0,0 +1,78 @@
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from typing import AsyncIterator
+
+try:
+    import orjson
+
+    def _dumps(data) -> bytes:
+        return orjson.dumps(data)
+except ImportError:
+    def _dumps(data) -> bytes:
+        return json.dumps(data, separators=(",", ":")).encode()
+
+
+DONE_FRAME = b"data: [DONE]\n\n"
+
+
+def sse_frame(event) -> bytes:
+    return b"data: " + _dumps(event) + b"\n\n"
+
+
+_END = object()
+
+
+async def coalesce_tokens(events: AsyncIterator[dict], flush_interval: float, flush_chars: int) -> AsyncIterator[dict]:
+    # Regroupe les tokens consecutifs et les emet quand la fenetre de temps ou de taille est atteinte.
+    # Un seul task lit le flux : le contexte (session de profilage...) est le meme pour tous les evenements
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def read():
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    queue.put_nowait(event)
+            queue.put_nowait(_END)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    reader = asyncio.create_task(read())
+    pending: list[str] = []
+    pending_chars = 0
+    deadline = 0.0
+    try:
+        while True:
+            if pending:
+                try:
+                    async with asyncio.timeout(max(0.0, deadline - time.monotonic())):
+                        event = await queue.get()
+                except TimeoutError:
+                    yield {"type": "token", "content": "".join(pending)}
+                    pending, pending_chars = [], 0
+                    continue
+            else:
+                event = await queue.get()
+            if event is _END:
+                break
+            if isinstance(event, Exception):
+                raise event
+            if event["type"] != "token":
+                if pending:
+                    yield {"type": "token", "content": "".join(pending)}
+                    pending, pending_chars = [], 0
+                yield event
+                continue
+            if not pending:
+                deadline = time.monotonic() + flush_interval
+            pending.append(event["content"])
+            pending_chars += len(event["content"])
+            if pending_chars >= flush_chars or time.monotonic() >= deadline:
+                yield {"type": "token", "content": "".join(pending)}
+                pending, pending_chars = [], 0
+        if pending:
+            yield {"type": "token", "content": "".join(pending)}
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
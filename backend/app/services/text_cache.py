@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, Iterator
+from app.config.settings import settings
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParsedTextCache:
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.jsonl.gz"
+
+    def has(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def get(self, digest: str) -> Iterator[tuple[int, str]] | None:
+        path = self._path(digest)
+        if not path.exists():
+            return None
+        return self._read(path)
+
+    def _read(self, path: Path) -> Iterator[tuple[int, str]]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                page, text = json.loads(line)
+                yield page, text
+
+    def store(self, digest: str, segments: Iterable[tuple[int, str]]) -> Iterator[tuple[int, str]]:
+        # Ecrit les pages au fur et a mesure qu'elles sont lues ; le fichier n'est publie
+        # qu'une fois le document entierement parse
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{digest}.{uuid.uuid4().hex}.tmp")
+        complete = False
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                for page, text in segments:
+                    f.write(json.dumps([page, text], ensure_ascii=False) + "\n")
+                    yield page, text
+            os.replace(tmp, path)
+            complete = True
+        finally:
+            if not complete:
+                tmp.unlink(missing_ok=True)
+
+
+text_cache = ParsedTextCache(settings.text_cache_dir)
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from app.core.base_vector_store import BaseVectorStore
+from app.config.settings import settings
+from app.services.chroma_store import ChromaVectorStore
+from app.services.local_store import LocalVectorStore
+
+logger = logging.getLogger(__name__)
+
+_drop_tasks: set[asyncio.Task] = set()
+
+
+def get_vector_store(collection_name: str, embed_model: str | None = None) -> BaseVectorStore:
+    if settings.vector_store_backend == "local":
+        return LocalVectorStore(collection_name, embed_model=embed_model)
+    return ChromaVectorStore(collection_name, embed_model=embed_model)
+
+
+async def get_vector_stores(collection_names: list[str]) -> dict[str, BaseVectorStore]:
+    if settings.vector_store_backend == "local":
+        return {name: LocalVectorStore(name) for name in collection_names}
+    return await ChromaVectorStore.for_collections(collection_names)
+
+
+async def drop_collection(collection_name: str, delay: float = 0.0) -> bool:
+    await asyncio.sleep(delay)
+    for attempt in range(settings.collection_drop_attempts):
+        try:
+            await get_vector_store(collection_name).drop_collection()
+            return True
+        except Exception as e:
+            logger.warning("Suppression de %s echouee (tentative %d): %s", collection_name, attempt + 1, e)
+            if attempt + 1 < settings.collection_drop_attempts:
+                await asyncio.sleep(settings.collection_drop_backoff * 2 ** attempt)
+    logger.error("Collection %s non supprimee apres %d tentatives", collection_name, settings.collection_drop_attempts)
+    return False
+
+
+def schedule_drop(collection_name: str, delay: float = 0.0) -> asyncio.Task:
+    task = asyncio.create_task(drop_collection(collection_name, delay))
+    _drop_tasks.add(task)
+    task.add_done_callback(_drop_tasks.discard)
+    return task
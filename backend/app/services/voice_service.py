@@ -7,6 +7,7 @@ import os
 from app.core.base_stt import BaseSTT
 from app.core.base_tts import BaseTTS
 from app.services.rag_service import RAGService
+from app.services.profiler import profile_stage, profile_target
 
 logger = logging.getLogger(__name__)
 
@@ -68,11 +69,12 @@ class VoiceService:
             if os.path.exists(wav_path):
                 os.unlink(wav_path)
 
-    async def ask_stream(self, question: str, model: str, conversation: list[dict] = None, options: dict = None, instruction: str = ""):
+    @profile_target("voice", lambda self: self.rag.namespace)
+    async def ask_stream(self, question: str, model: str, conversation: list[dict] = None, options: dict = None, instruction: str = "", conversation_id: str | None = None):
         buffer = ""
         in_code_block = False
 
-        async for event in self.rag.ask_stream(question, model, conversation, options, instruction):
+        async for event in self.rag.ask_stream(question, model, conversation, options, instruction, conversation_id=conversation_id):
             if event["type"] == "sources":
                 if buffer.strip() and not in_code_block:
                     result = await self._safe_synthesize(buffer.strip())
@@ -80,6 +82,9 @@ class VoiceService:
                         yield result
                 yield event
                 return
+            if event["type"] != "token":
+                yield event
+                continue
 
             token = event["content"]
             yield event
@@ -96,6 +101,7 @@ class VoiceService:
                 if result:
                     yield result
 
+    @profile_stage("tts")
     async def _safe_synthesize(self, text: str) -> dict | None:
         try:
             text = clean_for_tts(text)
@@ -0,0 +1,53 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_quantization import synthetic_vectors  # noqa: E402
+from app.services.ivf_index import IVFIndex, default_n_lists, default_nprobe, nearest_centroids, train_centroids  # noqa: E402
+from app.services.quantization import QuantizedMatrix, exact_distances, search, smallest  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel et latence de l'index IVF face a la recherche exacte")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="Le sondage par defaut (IVF_NPROBE non defini) est ajoute et marque d'un *")
+    parser.add_argument("--dtype", default="float32")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'taille':>10}{'listes':>8}{'nprobe':>8}{'rappel@k':>12}{'latence ms':>12}")
+    for size in args.sizes:
+        vectors = synthetic_vectors(size, args.dim, 256, rng)
+        queries = vectors[rng.integers(0, size, args.queries)] + 0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+        truth = [set(smallest(exact_distances(vectors, q), args.top_k)) for q in queries]
+        matrix = QuantizedMatrix.from_vectors(vectors, args.dtype)
+
+        start = time.perf_counter()
+        for query in queries:
+            search(matrix, query, args.top_k)
+        exact_latency = (time.perf_counter() - start) / len(queries) * 1000
+        print(f"{size:>10}{'-':>8}{'exact':>8}{1.0:>12.3f}{exact_latency:>12.2f}")
+
+        n_lists = default_n_lists(size)
+        sample = vectors[np.sort(rng.choice(size, min(size, n_lists * 64), replace=False))]
+        centroids = train_centroids(sample, n_lists)
+        ivf = IVFIndex(centroids, nearest_centroids(vectors, centroids), size)
+        for nprobe in sorted(set(args.nprobe) | {default_nprobe(ivf.n_lists)}):
+            hits, start = 0, time.perf_counter()
+            for query, expected in zip(queries, truth):
+                rows, _ = search(matrix, query, args.top_k, rows=ivf.probe(query, nprobe))
+                hits += len(expected & set(rows.tolist()))
+            latency = (time.perf_counter() - start) / len(queries) * 1000
+            marker = "*" if nprobe == default_nprobe(ivf.n_lists) else ""
+            print(f"{size:>10}{ivf.n_lists:>8}{marker + str(nprobe):>8}{hits / (len(queries) * args.top_k):>12.3f}{latency:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
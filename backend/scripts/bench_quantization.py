@@ -0,0 +1,47 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.quantization import QuantizedMatrix, exact_distances, search, smallest  # noqa: E402
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel et latence des vecteurs quantifies face au float32")
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(args.vectors, args.dim, 256, rng)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)] + 0.05 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    truth = [set(smallest(exact_distances(vectors, q), args.top_k)) for q in queries]
+
+    print(f"{'mode':<18}{'octets/vecteur':>16}{'rappel@k':>12}{'latence ms':>12}")
+    for dtype in ("float32", "float16", "int8"):
+        matrix = QuantizedMatrix.from_vectors(vectors, dtype)
+        modes = [(dtype, None)] if dtype == "float32" else [(dtype, None), (f"{dtype}+rescore", vectors)]
+        for label, full in modes:
+            hits, start = 0, time.perf_counter()
+            for query, expected in zip(queries, truth):
+                rows, _ = search(matrix, query, args.top_k, full=full, rescore_factor=args.rescore_factor)
+                hits += len(expected & set(rows.tolist()))
+            latency = (time.perf_counter() - start) / len(queries) * 1000
+            recall = hits / (len(queries) * args.top_k)
+            print(f"{label:<18}{matrix.nbytes / len(matrix):>16.0f}{recall:>12.3f}{latency:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fake_ollama import Latency, create_app  # noqa: E402
+from app.services.ollama_embedder import OllamaEmbedder  # noqa: E402
+from app.services.ollama_pool import OllamaPool  # noqa: E402
+from app.services.ollama_service import OllamaLLM  # noqa: E402
+
+CHAT_MODEL = "llama3.1:8b"
+EMBED_MODEL = "nomic-embed-text"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeServer:
+
+    def __init__(self, name: str, port: int, **kwargs):
+        self.name = name
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.app = create_app(name=name, **kwargs)
+        self.server = None
+        self.thread = None
+
+    def start(self) -> None:
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=self.port, log_level="error")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def chat_once(llm: OllamaLLM, delay: float) -> None:
+    await asyncio.sleep(delay)
+    async for _ in llm.chat_stream([{"role": "user", "content": "bonjour"}], CHAT_MODEL):
+        pass
+
+
+async def run(args) -> list[str]:
+    failures = []
+
+    def check(condition: bool, message: str) -> None:
+        print(("OK    " if condition else "ECHEC ") + message)
+        if not condition:
+            failures.append(message)
+
+    # Le dernier serveur est plus lent : l'equilibrage doit lui envoyer moins de requetes
+    servers = [
+        FakeServer(f"fake{i}", free_port(), ttft=Latency(args.ttft * (3 if i == args.servers - 1 else 1)), token_delay=Latency(0.005), answer_tokens=20)
+        for i in range(args.servers)
+    ]
+    for server in servers:
+        server.start()
+    pool = OllamaPool([server.url for server in servers], health_interval=0.2, failure_cooldown=1.0)
+    llm = OllamaLLM(pool)
+    embedder = OllamaEmbedder(EMBED_MODEL, pool)
+
+    try:
+        await pool.check_health()
+        check(all(endpoint.healthy for endpoint in pool.endpoints), "tous les serveurs repondent au controle de sante")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(chat_once(llm, i * args.ttft / 4) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        served = Counter({server.name: server.app.state.requests["chat"] for server in servers})
+        print(f"      {args.requests} conversations en {elapsed:.2f}s, repartition {dict(served)}")
+        check(sum(served.values()) == args.requests, "chaque conversation est servie une seule fois")
+        check(min(served.values()) > 0, "chaque serveur recoit du trafic")
+        check(served[servers[-1].name] < served[servers[0].name], "le serveur le plus lent recoit moins de conversations")
+        check(all(endpoint.outstanding == 0 for endpoint in pool.endpoints), "les compteurs de requetes en cours reviennent a zero")
+
+        vectors = await embedder.embed_batch(["a", "b", "c"])
+        check(len(vectors) == 3, "embedding servi par le pool")
+
+        down = servers[0]
+        down.stop()
+        before = sum(server.app.state.requests["embed"] for server in servers[1:])
+        results = await asyncio.gather(*(embedder.embed(f"question {i}") for i in range(args.requests)), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        check(not errors, f"bascule des embeddings quand {down.name} est arrete ({len(errors)} erreurs)")
+        check(not pool.endpoints[0].healthy, f"{down.name} est marque indisponible")
+        after = sum(server.app.state.requests["embed"] for server in servers[1:])
+        check(after - before == args.requests, "les embeddings sont servis par les autres serveurs")
+
+        pool.start()
+        down.start()
+        deadline = time.monotonic() + 5
+        while not pool.endpoints[0].healthy and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        check(pool.endpoints[0].healthy, f"{down.name} revient dans le pool apres le controle de sante")
+    finally:
+        await pool.stop()
+        for server in servers:
+            if server.server and not server.server.should_exit:
+                server.stop()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifie la repartition et la bascule du pool Ollama sur des serveurs factices")
+    parser.add_argument("--servers", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    args = parser.parse_args()
+    failures = asyncio.run(run(args))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+# La collection d'evaluation est toujours locale et jetable
+EVAL_DIR = tempfile.mkdtemp(prefix="heyrag-eval-")
+os.environ["VECTOR_STORE_BACKEND"] = "local"
+os.environ["VECTOR_STORE_DIR"] = EVAL_DIR
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config.settings import settings  # noqa: E402
+from app.core.base_embedder import BaseEmbedder  # noqa: E402
+from app.services.document_service import DocumentService  # noqa: E402
+from app.services.local_store import LocalVectorStore  # noqa: E402
+from app.services.ollama_embedder import OllamaEmbedder  # noqa: E402
+from app.services.rag_service import MAX_DISTANCE, RAGService  # noqa: E402
+
+SUPPORTED = {".pdf", ".docx", ".txt", ".md"}
+WORD = re.compile(r"\w+")
+CHARS_PER_TOKEN = 4
+
+
+class HashingEmbedder(BaseEmbedder):
+    # Sac de mots hache : sans Ollama, pour verifier le harnais ou comparer des decoupages
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD.findall(text.lower()):
+            digest = int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little")
+            vector[digest % self.dim] += 1.0 if digest & 1 << 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    async def embed(self, text: str) -> list[float]:
+        return self._vector(text)
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(text) for text in texts]
+
+
+def tokens(text: str) -> set[str]:
+    return set(WORD.findall(text.lower()))
+
+
+def load_questions(path: Path) -> list[dict]:
+    text = path.read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def is_hit(chunk, expected: dict, min_overlap: float) -> bool:
+    if expected.get("filename") and chunk.metadata.get("filename") != expected["filename"]:
+        return False
+    wanted = tokens(expected["expected"])
+    if not wanted:
+        return False
+    return len(wanted & tokens(chunk.text)) / len(wanted) >= min_overlap
+
+
+def directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def pareto(rows: list[dict]) -> None:
+    # Une configuration est dominee si une autre fait au moins aussi bien partout et mieux quelque part
+    def dominates(a: dict, b: dict) -> bool:
+        better_or_equal = a["recall"] >= b["recall"] and a["p95_ms"] <= b["p95_ms"] and a["prompt_tokens"] <= b["prompt_tokens"]
+        strictly = a["recall"] > b["recall"] or a["p95_ms"] < b["p95_ms"] or a["prompt_tokens"] < b["prompt_tokens"]
+        return better_or_equal and strictly
+
+    for row in rows:
+        row["pareto"] = not any(dominates(other, row) for other in rows if other is not row)
+
+
+async def ingest(files: list[Path], embedder: BaseEmbedder, name: str, chunk_size: int, chunk_overlap: int) -> tuple[LocalVectorStore, int, float]:
+    store = LocalVectorStore(name)
+    service = DocumentService(embedder=embedder, store=store, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    start = time.perf_counter()
+    chunks = 0
+    for file in files:
+        result = await service.ingest(str(file), file.name)
+        chunks += result["chunks_count"]
+    return store, chunks, time.perf_counter() - start
+
+
+async def evaluate(service: RAGService, questions: list[dict], top_k: int, min_overlap: float) -> dict:
+    latencies, ranks, prompt_tokens = [], [], []
+    for item in questions:
+        start = time.perf_counter()
+        chunks = await service._retrieve(item["question"], top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rank = next((i for i, chunk in enumerate(chunks, start=1) if is_hit(chunk, item, min_overlap)), None)
+        ranks.append(rank)
+        messages = service._build_messages(item["question"], chunks)
+        prompt_tokens.append(sum(len(message["content"]) for message in messages) / CHARS_PER_TOKEN)
+    return {
+        "recall": sum(rank is not None for rank in ranks) / len(ranks),
+        "mrr": sum(1 / rank for rank in ranks if rank) / len(ranks),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "prompt_tokens": statistics.mean(prompt_tokens),
+    }
+
+
+async def run(args) -> list[dict]:
+    files = sorted(path for path in Path(args.corpus).rglob("*") if path.suffix.lower() in SUPPORTED)
+    if not files:
+        raise SystemExit(f"Aucun document supporte dans {args.corpus}")
+    questions = load_questions(Path(args.questions))
+    embedder = HashingEmbedder() if args.hashing_embedder else OllamaEmbedder(args.embed_model)
+
+    # Les embeddings des questions ne dependent pas du decoupage : calcules une seule fois,
+    # la latence mesuree est celle de la recherche
+    question_embeddings = dict(zip(
+        (item["question"] for item in questions),
+        await embedder.embed_batch([item["question"] for item in questions]),
+    ))
+
+    rows = []
+    for chunker in args.chunkers:
+        settings.streaming_chunker = chunker == "streaming"
+        for chunk_size, chunk_overlap in itertools.product(args.chunk_sizes, args.overlaps):
+            if chunk_overlap >= chunk_size:
+                continue
+            name = f"eval_{chunker}_{chunk_size}_{chunk_overlap}"
+            store, chunks, ingest_s = await ingest(files, embedder, name, chunk_size, chunk_overlap)
+            index_bytes = directory_size(Path(EVAL_DIR) / name)
+            for top_k, max_distance in itertools.product(args.top_k, args.max_distance):
+                service = RAGService(llm=None, embedder=embedder, store=store, max_distance=max_distance)
+                service._question_embeddings.update(question_embeddings)
+                metrics = await evaluate(service, questions, top_k, args.min_overlap)
+                rows.append({
+                    "chunker": chunker,
+                    "chunk_size": chunk_size,
+                    "overlap": chunk_overlap,
+                    "top_k": top_k,
+                    "max_distance": max_distance,
+                    "chunks": chunks,
+                    "index_kb": index_bytes / 1024,
+                    "ingest_s": ingest_s,
+                    **metrics,
+                })
+            await store.drop_collection()
+    pareto(rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Qualite de la recherche face a la latence, sur une grille de configurations")
+    parser.add_argument("corpus", help="Dossier de documents (.pdf, .docx, .txt, .md)")
+    parser.add_argument("questions", help="JSON ou JSONL : {question, expected, filename?}")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[settings.chunk_size])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[settings.chunk_overlap])
+    parser.add_argument("--chunkers", nargs="+", choices=["legacy", "streaming"], default=["streaming" if settings.streaming_chunker else "legacy"])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5])
+    parser.add_argument("--max-distance", type=float, nargs="+", default=[MAX_DISTANCE])
+    parser.add_argument("--min-overlap", type=float, default=0.6, help="Part des mots du passage attendu presents dans le chunk")
+    parser.add_argument("--embed-model", default=None)
+    parser.add_argument("--hashing-embedder", action="store_true", help="Embeddings locaux par hachage, sans Ollama")
+    parser.add_argument("--json", help="Ecrit les resultats dans ce fichier")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    header = f"{'':2}{'chunker':<10}{'taille':>7}{'chev.':>6}{'k':>4}{'dist.':>6}{'chunks':>8}{'index Ko':>10}{'rappel@k':>10}{'MRR':>7}{'p50 ms':>8}{'p95 ms':>8}{'tokens~':>9}"
+    print(header)
+    for row in sorted(rows, key=lambda row: (-row["recall"], row["p95_ms"])):
+        print(
+            f"{'*' if row['pareto'] else '':2}{row['chunker']:<10}{row['chunk_size']:>7}{row['overlap']:>6}{row['top_k']:>4}"
+            f"{row['max_distance']:>6.2f}{row['chunks']:>8}{row['index_kb']:>10.0f}{row['recall']:>10.3f}{row['mrr']:>7.3f}"
+            f"{row['p50_ms']:>8.2f}{row['p95_ms']:>8.2f}{row['prompt_tokens']:>9.0f}"
+        )
+    print("* : front de Pareto (rappel, latence p95, tokens de prompt)")
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    # Les index de chaque configuration ne servent qu'a cette evaluation
+    try:
+        main()
+    finally:
+        shutil.rmtree(EVAL_DIR, ignore_errors=True)
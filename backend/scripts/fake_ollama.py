@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timezone
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+SENTENCE_TOKENS = 12
+WORDS = "le la les un une des et ou mais donc car document contrat article clause page section donnees modele reponse".split()
+
+
+class Latency:
+
+    def __init__(self, median: float, sigma: float = 0.5):
+        self.median = median
+        self.sigma = sigma
+
+    def sample(self) -> float:
+        # Distribution log-normale : la plupart des appels proches de la mediane, une queue longue
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(np.log(self.median), self.sigma)
+
+
+def fake_embedding(text: str, dim: int) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def create_app(
+    name: str = "fake",
+    models: tuple[str, ...] = ("llama3.1:8b", "nomic-embed-text"),
+    dim: int = 768,
+    ttft: Latency | None = None,
+    token_delay: Latency | None = None,
+    answer_tokens: int = 60,
+    embed_latency: Latency | None = None,
+    fail_rate: float = 0.0,
+) -> FastAPI:
+    ttft = ttft or Latency(0.2)
+    token_delay = token_delay or Latency(0.02, 0.3)
+    embed_latency = embed_latency or Latency(0.02)
+    app = FastAPI(title=f"Fake Ollama {name}")
+    app.state.requests = {"chat": 0, "embed": 0, "tags": 0, "show": 0}
+    app.state.active = 0
+
+    def maybe_fail():
+        if fail_rate and random.random() < fail_rate:
+            raise HTTPException(status_code=500, detail="erreur simulee")
+
+    def check_model(model: str):
+        if model not in models:
+            raise HTTPException(status_code=404, detail=f"model '{model}' not found")
+
+    @app.get("/api/tags")
+    async def tags():
+        app.state.requests["tags"] += 1
+        return {"models": [{"name": model, "model": model, "size": 0, "digest": "", "details": {}} for model in models]}
+
+    @app.post("/api/show")
+    async def show(request: Request):
+        body = await request.json()
+        app.state.requests["show"] += 1
+        check_model(body["model"])
+        return {"modelfile": "", "parameters": "", "template": "", "details": {}, "model_info": {"llama.context_length": 8192}}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        app.state.requests["embed"] += 1
+        check_model(body["model"])
+        maybe_fail()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        app.state.active += 1
+        try:
+            await asyncio.sleep(embed_latency.sample() * max(1, len(inputs) / 16))
+        finally:
+            app.state.active -= 1
+        return {"model": body["model"], "embeddings": [fake_embedding(text, dim) for text in inputs]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests["chat"] += 1
+        check_model(body["model"])
+        maybe_fail()
+        prompt_chars = sum(len(message.get("content", "")) for message in body["messages"])
+
+        def message(content: str, done: bool, **stats) -> dict:
+            return {
+                "model": body["model"],
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+                **stats,
+            }
+
+        async def generate():
+            app.state.active += 1
+            try:
+                start = time.perf_counter()
+                await asyncio.sleep(ttft.sample())
+                prompt_eval = time.perf_counter() - start
+                for i in range(answer_tokens):
+                    if i:
+                        await asyncio.sleep(token_delay.sample())
+                    # Des phrases completes, pour que la voix puisse synthetiser au fil de l'eau
+                    yield random.choice(WORDS) + (". " if i % SENTENCE_TOKENS == SENTENCE_TOKENS - 1 else " ")
+                stats = {
+                    "done_reason": "stop",
+                    "prompt_eval_count": prompt_chars // 4,
+                    "prompt_eval_duration": int(prompt_eval * 1e9),
+                    "eval_count": answer_tokens,
+                    "total_duration": int((time.perf_counter() - start) * 1e9),
+                }
+                yield stats
+            finally:
+                app.state.active -= 1
+
+        if not body.get("stream", True):
+            parts = []
+            async for part in generate():
+                if isinstance(part, dict):
+                    return message("".join(parts), True, **part)
+                parts.append(part)
+
+        async def ndjson():
+            async for part in generate():
+                if isinstance(part, dict):
+                    yield json.dumps(message("", True, **part)) + "\n"
+                else:
+                    yield json.dumps(message(part, False)) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serveur Ollama factice pour les tests de charge et de repartition")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--name", default="fake")
+    parser.add_argument("--models", nargs="+", default=["llama3.1:8b", "nomic-embed-text"])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Mediane du temps avant le premier token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Mediane entre deux tokens (s)")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_app(
+        name=args.name,
+        models=tuple(args.models),
+        dim=args.dim,
+        ttft=Latency(args.ttft),
+        token_delay=Latency(args.token_delay, 0.3),
+        answer_tokens=args.answer_tokens,
+        embed_latency=Latency(args.embed_latency),
+        fail_rate=args.fail_rate,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
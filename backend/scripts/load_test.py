@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+import httpx
+import numpy as np
+import websockets
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from check_ollama_pool import FakeServer, free_port  # noqa: E402
+from fake_ollama import WORDS, Latency  # noqa: E402
+from app.core.base_stt import BaseSTT  # noqa: E402
+from app.core.base_tts import BaseTTS  # noqa: E402
+from app.services.inference_worker import InferenceWorker  # noqa: E402
+
+CHAT_MODEL = "llama3.1:8b"
+EMBED_MODEL = "nomic-embed-text"
+QUESTIONS = [
+    "Que dit le contrat sur la resiliation ?",
+    "Quelles sont les obligations de chaque partie ?",
+    "Resume la section sur les donnees personnelles.",
+    "Quel est le delai de preavis prevu ?",
+    "Quelles clauses concernent la confidentialite ?",
+]
+TTS_SECONDS_PER_CHAR = 0.06
+
+
+def wav_bytes(seconds: float, sample_rate: int) -> bytes:
+    samples = (np.random.default_rng().normal(scale=0.05, size=int(seconds * sample_rate)) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class FakeSTT(BaseSTT):
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    async def load(self) -> None:
+        pass
+
+    async def transcribe(self, audio_path: str) -> str:
+        return await self.transcribe_audio(None)
+
+    async def transcribe_audio(self, audio) -> str:
+        await asyncio.sleep(self.latency.sample())
+        return random.choice(QUESTIONS)
+
+
+class FakeTTS(BaseTTS):
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    async def load(self) -> None:
+        pass
+
+    async def synthesize(self, text: str) -> tuple[bytes, int]:
+        # Kokoro synthetise plus vite que le temps reel : latence proportionnelle a la longueur de la phrase
+        await asyncio.sleep(self.latency.sample() * max(1.0, len(text) / 100))
+        return wav_bytes(len(text) * TTS_SECONDS_PER_CHAR, 24000), 24000
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    return float(np.percentile(values, q)) if values else None
+
+
+async def chat_session(client: httpx.AsyncClient, base_url: str, project_id: str) -> dict:
+    result = {"kind": "chat", "ttft": None, "chars": 0, "error": None}
+    start = time.perf_counter()
+    body = {"question": random.choice(QUESTIONS), "model": CHAT_MODEL, "project_id": project_id}
+    async with client.stream("POST", f"{base_url}/api/chat/stream", json=body) as response:
+        if response.status_code != 200:
+            result["error"] = f"HTTP {response.status_code}"
+            return result
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            if line == "data: [DONE]":
+                break
+            event = json.loads(line[6:])
+            if event["type"] == "token":
+                if result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - start
+                result["chars"] += len(event["content"])
+            elif event["type"] == "error":
+                result["error"] = event["content"]
+    result["duration"] = time.perf_counter() - start
+    return result
+
+
+async def voice_session(ws_url: str, project_id: str, audio: bytes) -> dict:
+    result = {"kind": "voice", "ttft": None, "ttfa": None, "chars": 0, "error": None}
+    start = time.perf_counter()
+    async with websockets.connect(f"{ws_url}/ws/voice", max_size=None) as ws:
+        await ws.send(json.dumps({"type": "config", "project_id": project_id, "model": CHAT_MODEL}))
+        await ws.send(audio)
+        # Les delais sont mesures depuis la fin de l'envoi de l'audio, comme les percoit l'utilisateur
+        sent = time.perf_counter()
+        async for message in ws:
+            if isinstance(message, bytes):
+                if result["ttfa"] is None:
+                    result["ttfa"] = time.perf_counter() - sent
+                continue
+            event = json.loads(message)
+            if event["type"] == "token":
+                if result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - sent
+                result["chars"] += len(event["content"])
+            elif event["type"] == "error":
+                result["error"] = event["content"]
+                break
+            elif event["type"] == "done":
+                break
+        else:
+            result["error"] = result["error"] or "Connexion fermee avant la fin"
+    result["duration"] = time.perf_counter() - start
+    return result
+
+
+async def run_stage(args, client: httpx.AsyncClient, base_url: str, project_id: str, concurrency: int, audio: bytes) -> dict:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + args.duration
+    voice_users = round(concurrency * args.voice_ratio)
+    ws_url = base_url.replace("http", "ws", 1)
+    results = []
+
+    async def user(voice: bool) -> None:
+        # Boucle fermee : chaque utilisateur enchaine les sessions jusqu'a la fin du palier
+        while loop.time() < deadline:
+            try:
+                if voice:
+                    result = await voice_session(ws_url, project_id, audio)
+                else:
+                    result = await chat_session(client, base_url, project_id)
+            except Exception as e:
+                result = {"kind": "voice" if voice else "chat", "ttft": None, "ttfa": None, "chars": 0, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            if args.think_time:
+                await asyncio.sleep(random.expovariate(1 / args.think_time))
+
+    start = loop.time()
+    await asyncio.gather(*(user(i < voice_users) for i in range(concurrency)))
+    elapsed = loop.time() - start
+
+    ok = [result for result in results if not result["error"]]
+    errors = [result["error"] for result in results if result["error"]]
+    return {
+        "concurrency": concurrency,
+        "chat_users": concurrency - voice_users,
+        "voice_users": voice_users,
+        "sessions": len(results),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(results) if results else 0.0,
+        "sessions_per_s": len(ok) / elapsed,
+        "chars_per_s": sum(result["chars"] for result in ok) / elapsed,
+        "ttft_p50": percentile([r["ttft"] for r in ok if r["kind"] == "chat" and r["ttft"] is not None], 50),
+        "ttft_p95": percentile([r["ttft"] for r in ok if r["kind"] == "chat" and r["ttft"] is not None], 95),
+        "ttfa_p50": percentile([r["ttfa"] for r in ok if r["kind"] == "voice" and r["ttfa"] is not None], 50),
+        "ttfa_p95": percentile([r["ttfa"] for r in ok if r["kind"] == "voice" and r["ttfa"] is not None], 95),
+        "first_errors": sorted(set(errors))[:3],
+    }
+
+
+async def setup_project(client: httpx.AsyncClient, base_url: str, documents: int, words: int) -> str:
+    response = await client.post(f"{base_url}/api/projects/", json={"name": f"charge-{int(time.time())}"})
+    response.raise_for_status()
+    project_id = response.json()["id"]
+    for i in range(documents):
+        text = " ".join(random.choice(WORDS) for _ in range(words))
+        response = await client.post(
+            f"{base_url}/api/documents/upload",
+            params={"project_id": project_id},
+            files={"file": (f"document_{i}.txt", text.encode(), "text/plain")},
+        )
+        response.raise_for_status()
+    return project_id
+
+
+async def wait_healthy(client: httpx.AsyncClient, base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"L'API s'est arretee au demarrage (code {process.returncode})")
+        try:
+            if (await client.get(f"{base_url}/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("L'API n'a pas demarre a temps")
+
+
+def start_api(args, workdir: Path, ollama_url: str, socket_path: Path, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{workdir / 'load.db'}",
+        "OLLAMA_BASE_URL": ollama_url,
+        "OLLAMA_EMBED_MODEL": EMBED_MODEL,
+        "VECTOR_STORE_BACKEND": args.vector_store,
+        "VECTOR_STORE_DIR": str(workdir / "vectors"),
+        "INFERENCE_WORKER_ENABLED": "true",
+        "INFERENCE_SOCKET": str(socket_path),
+        "VOICE_MAX_SESSIONS": str(args.voice_sessions),
+    }
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    log = open(workdir / "api.log", "wb")
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def run(args) -> list[dict]:
+    workdir = Path(tempfile.mkdtemp(prefix="heyrag-load-"))
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    fake_ollama = inference = api = None
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            if args.target:
+                base_url = args.target.rstrip("/")
+            else:
+                fake_ollama = FakeServer(
+                    "ollama", free_port(),
+                    models=(CHAT_MODEL, EMBED_MODEL),
+                    ttft=Latency(args.ttft),
+                    token_delay=Latency(args.token_delay, 0.3),
+                    answer_tokens=args.answer_tokens,
+                    embed_latency=Latency(args.embed_latency),
+                    fail_rate=args.fail_rate,
+                )
+                fake_ollama.start()
+                # Le worker d'inference tourne ici, avec des modeles factices : l'API passe par le vrai protocole
+                socket_path = workdir / "inference.sock"
+                worker = InferenceWorker(FakeSTT(Latency(args.stt_latency)), FakeTTS(Latency(args.tts_latency)))
+                inference = await asyncio.start_unix_server(worker.handle, str(socket_path))
+                port = free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                if args.voice_ratio and not shutil.which("ffmpeg"):
+                    print("Attention : ffmpeg introuvable, les sessions vocales vont echouer")
+                api = start_api(args, workdir, fake_ollama.url, socket_path, port)
+                await wait_healthy(client, base_url, api, args.startup_timeout)
+
+            project_id = args.project_id or await setup_project(client, base_url, args.documents, args.document_words)
+            audio = wav_bytes(args.audio_seconds, 16000)
+            rows = []
+            for concurrency in args.concurrency:
+                row = await run_stage(args, client, base_url, project_id, concurrency, audio)
+                print_row(row)
+                rows.append(row)
+            return rows
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+        if inference is not None:
+            inference.close()
+        if fake_ollama is not None:
+            fake_ollama.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def ms(value: float | None) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+def print_header() -> None:
+    print(f"{'users':>6}{'chat':>6}{'voix':>6}{'sessions':>10}{'erreurs':>9}{'sess/s':>8}{'car/s':>9}"
+          f"{'TTFT p50':>10}{'p95':>7}{'TTFA p50':>10}{'p95':>7}")
+
+
+def print_row(row: dict) -> None:
+    print(f"{row['concurrency']:>6}{row['chat_users']:>6}{row['voice_users']:>6}{row['sessions']:>10}"
+          f"{row['error_rate']:>8.1%} {row['sessions_per_s']:>8.2f}{row['chars_per_s']:>9.0f}"
+          f"{ms(row['ttft_p50']):>10}{ms(row['ttft_p95']):>7}{ms(row['ttfa_p50']):>10}{ms(row['ttfa_p95']):>7}")
+    for error in row["first_errors"]:
+        print(f"{'':6}! {error[:100]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge : sessions chat (SSE) et voix (WebSocket) concurrentes, par paliers")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Paliers d'utilisateurs simultanes")
+    parser.add_argument("--duration", type=float, default=20.0, help="Duree de chaque palier (s)")
+    parser.add_argument("--voice-ratio", type=float, default=0.25, help="Part des utilisateurs en voix")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause moyenne entre deux sessions d'un utilisateur (s)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--target", help="URL d'une instance deja lancee ; sinon l'API et les backends factices sont demarres ici")
+    parser.add_argument("--project-id", help="Projet existant a interroger ; sinon un projet est cree et alimente")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--document-words", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=1, help="Workers uvicorn de l'API")
+    parser.add_argument("--voice-sessions", type=int, default=8, help="VOICE_MAX_SESSIONS de l'API")
+    parser.add_argument("--vector-store", choices=["local", "chroma"], default="local", help="chroma : utilise le serveur de CHROMA_HOST")
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Mediane du temps avant le premier token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="Mediane entre deux tokens (s)")
+    parser.add_argument("--answer-tokens", type=int, default=80)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Part des appels Ollama en erreur")
+    parser.add_argument("--stt-latency", type=float, default=0.4, help="Mediane d'une transcription (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="Mediane de synthese d'une phrase de 100 caracteres (s)")
+    parser.add_argument("--audio-seconds", type=float, default=3.0)
+    parser.add_argument("--max-ttft-p95", type=float, help="Echoue si le TTFT p95 d'un palier depasse cette valeur (ms)")
+    parser.add_argument("--max-error-rate", type=float, help="Echoue si le taux d'erreur d'un palier depasse cette valeur")
+    parser.add_argument("--json", help="Ecrit les resultats dans ce fichier")
+    args = parser.parse_args()
+
+    print_header()
+    rows = asyncio.run(run(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+
+    failures = []
+    for row in rows:
+        if args.max_ttft_p95 is not None and row["ttft_p95"] is not None and row["ttft_p95"] * 1000 > args.max_ttft_p95:
+            failures.append(f"{row['concurrency']} utilisateurs : TTFT p95 {ms(row['ttft_p95'])} ms")
+        if args.max_error_rate is not None and row["error_rate"] > args.max_error_rate:
+            failures.append(f"{row['concurrency']} utilisateurs : {row['error_rate']:.1%} d'erreurs")
+    for failure in failures:
+        print(f"ECHEC : {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
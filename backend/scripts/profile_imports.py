@@ -0,0 +1,68 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+WALL_TIME = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def run_python(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    # Un nouvel interpreteur par mesure : aucun module deja charge
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    return subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+
+
+def profile(module: str) -> list[tuple[str, int, int, int]]:
+    result = run_python(f"import {module}", importtime=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def wall_time_ms(module: str, runs: int) -> float:
+    samples = [float(run_python(WALL_TIME.format(module=module)).stdout.strip()) * 1000 for _ in range(runs)]
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cout d'import par module et controle du budget de demarrage")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25, help="Nombre de modules affiches")
+    parser.add_argument("--runs", type=int, default=5, help="Imports a froid pour la mediane")
+    parser.add_argument(
+        "--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", 0)) or None,
+        help="Echoue si la mediane depasse ce budget (ou IMPORT_BUDGET_MS)",
+    )
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    print(f"{'cumule ms':>10}{'propre ms':>11}  module")
+    for name, self_us, cumulative_us, depth in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f}{self_us / 1000:>11.1f}  {'  ' * min(depth, 4)}{name}")
+
+    packages = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    print(f"\n{'propre ms':>10}  paquet")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{self_us / 1000:>10.1f}  {package}")
+
+    median = wall_time_ms(args.module, args.runs)
+    print(f"\nimport {args.module} : {median:.0f} ms (mediane sur {args.runs} runs)")
+    if args.budget_ms is not None and median > args.budget_ms:
+        print(f"ECHEC : budget de {args.budget_ms:.0f} ms depasse")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import pytest
+from check_ollama_pool import FakeServer, free_port
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def fake_servers():
+    # Fabrique de serveurs Ollama factices, arretes a la fin du test
+    servers = []
+
+    def start(count: int, **kwargs) -> list[FakeServer]:
+        started = []
+        for _ in range(count):
+            server = FakeServer(f"fake{len(servers)}", free_port(), **kwargs)
+            server.start()
+            servers.append(server)
+            started.append(server)
+        return started
+
+    yield start
+    for server in servers:
+        if server.server and not server.server.should_exit:
+            server.stop()
@@ -0,0 +1,22 @@
+import os
+import pytest
+from profile_imports import profile
+
+# Dependances chargees a la premiere utilisation seulement
+LAZY_PACKAGES = {"fitz", "docx", "chromadb", "langchain_text_splitters", "mlx", "mlx_audio", "soundfile"}
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", 2000))
+
+
+@pytest.fixture(scope="module")
+def imports():
+    return profile("app.main")
+
+
+def test_heavy_dependencies_are_not_imported(imports):
+    loaded = {name.split(".")[0] for name, _, _, _ in imports}
+    assert not loaded & LAZY_PACKAGES
+
+
+def test_import_time_within_budget(imports):
+    cumulative_us = next(cumulative for name, _, cumulative, _ in imports if name == "app.main")
+    assert cumulative_us / 1000 < IMPORT_BUDGET_MS
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import httpx
+import pytest
+from check_ollama_pool import CHAT_MODEL, EMBED_MODEL, chat_once
+from fake_ollama import Latency
+from app.services.ollama_embedder import OllamaEmbedder
+from app.services.ollama_pool import OllamaPool
+from app.services.ollama_service import OllamaLLM
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def make_pool():
+    pools = []
+
+    def create(servers, **kwargs) -> OllamaPool:
+        pool = OllamaPool([server.url for server in servers], health_interval=0.2, failure_cooldown=1.0, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield create
+    for pool in pools:
+        await pool.stop()
+
+
+async def test_health_check_marks_servers_healthy_and_learns_models(fake_servers, make_pool):
+    servers = fake_servers(2, models=(CHAT_MODEL,))
+    pool = make_pool(servers)
+    await pool.check_health()
+    assert all(endpoint.healthy for endpoint in pool.endpoints)
+    assert all(endpoint.models == {CHAT_MODEL} for endpoint in pool.endpoints)
+
+
+async def test_slow_server_receives_less_traffic(fake_servers, make_pool):
+    fast = fake_servers(2, ttft=Latency(0.05), token_delay=Latency(0.005), answer_tokens=20)
+    slow = fake_servers(1, ttft=Latency(0.15), token_delay=Latency(0.005), answer_tokens=20)
+    servers = fast + slow
+    pool = make_pool(servers)
+    llm = OllamaLLM(pool)
+    await asyncio.gather(*(chat_once(llm, i * 0.0125) for i in range(60)))
+    served = [server.app.state.requests["chat"] for server in servers]
+    assert sum(served) == 60
+    assert min(served) > 0
+    assert served[2] < served[0]
+    assert all(endpoint.outstanding == 0 for endpoint in pool.endpoints)
+
+
+async def test_model_routes_pin_requests_to_their_servers(fake_servers, make_pool):
+    servers = fake_servers(3, ttft=Latency(0.01), token_delay=Latency(0.001), answer_tokens=5)
+    pool = make_pool(servers, routes={CHAT_MODEL: [servers[1].url]})
+    llm = OllamaLLM(pool)
+    await asyncio.gather(*(chat_once(llm, 0) for _ in range(10)))
+    assert [server.app.state.requests["chat"] for server in servers] == [0, 10, 0]
+
+
+async def test_requests_prefer_servers_announcing_the_model(fake_servers, make_pool):
+    chat_only = fake_servers(1, models=(CHAT_MODEL,))
+    both = fake_servers(1)
+    pool = make_pool(chat_only + both)
+    await pool.check_health()
+    embedder = OllamaEmbedder(EMBED_MODEL, pool)
+    await asyncio.gather(*(embedder.embed(f"question {i}") for i in range(10)))
+    assert chat_only[0].app.state.requests["embed"] == 0
+    assert both[0].app.state.requests["embed"] == 10
+
+
+async def test_embeddings_fail_over_when_a_server_stops(fake_servers, make_pool):
+    servers = fake_servers(3)
+    pool = make_pool(servers)
+    embedder = OllamaEmbedder(EMBED_MODEL, pool)
+    servers[0].stop()
+    results = await asyncio.gather(*(embedder.embed(f"question {i}") for i in range(20)), return_exceptions=True)
+    assert not [result for result in results if isinstance(result, Exception)]
+    assert not pool.endpoints[0].healthy
+    assert sum(server.app.state.requests["embed"] for server in servers[1:]) == 20
+
+
+async def test_stopped_server_rejoins_after_health_check(fake_servers, make_pool):
+    servers = fake_servers(2)
+    pool = make_pool(servers)
+    servers[0].stop()
+    await pool.check_health()
+    assert not pool.endpoints[0].healthy
+
+    pool.start()
+    servers[0].start()
+    deadline = time.monotonic() + 5
+    while not pool.endpoints[0].healthy and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    assert pool.endpoints[0].healthy
+
+
+async def test_connection_limits_apply_per_endpoint(fake_servers, make_pool):
+    servers = fake_servers(2)
+    pool = make_pool(servers, limits=httpx.Limits(max_connections=3, max_keepalive_connections=1))
+    for endpoint in pool.endpoints:
+        transport = endpoint.client._client._transport
+        assert transport._pool._max_connections == 3
+        assert transport._pool._max_keepalive_connections == 1